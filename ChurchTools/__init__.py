@@ -1 +1,4 @@
 from .session import Session
+from .resolve import NameIndex, name_matches, plan_searches, search_key
+from .cache import RunCache
+from .store import SessionStore, export_cookies, import_cookies
@@ -0,0 +1,134 @@
+import contextlib
+import threading
+import typing
+
+from .resolve import NameIndex, search_key
+
+
+class RunCache:
+
+  def __init__( self, limit: int | None = None ) -> None:
+    self.lock: threading.RLock = threading.RLock()
+    self.limit: int | None = limit
+    self.resolves: int = 0
+    self.clear()
+
+  def clear( self ):
+    with self.lock:
+      self.songs: dict[ int, dict ] = {}
+      self.searches: dict[ str, list[ dict ] ] = {}
+      self.catalog: NameIndex | None = None
+      self.listed: set[ int ] = set()
+      self.recent: list[ dict ] = []
+
+  def make_room( self ):
+    # Everything in here can be fetched again, so forgetting all of it is safe between resolves.
+    # A listing still in flight may predate a song added meanwhile, which is only known from self.recent.
+    if self.limit is not None and not self.resolves and len( self.songs ) >= self.limit:
+      self.clear()
+
+  @contextlib.contextmanager
+  def resolving( self ) -> typing.Iterator[ None ]:
+    with self.lock:
+      self.resolves += 1
+    try:
+      yield
+    finally:
+      with self.lock:
+        self.resolves -= 1
+        if not self.resolves:
+          self.recent = []
+        self.make_room()
+
+  def merge( self, songs: typing.Iterable[ dict ], key: str = "" ) -> list[ dict ]:
+    songs = self.canonical( songs )
+    listed = { id( song ) for song in songs }
+    for song in self.recent:
+      if id( song ) not in listed and self.songs.get( song[ "id" ] ) is song and key in search_key( song.get( "name", "" ) ):
+        listed.add( id( song ) )
+        songs.append( song )
+    return songs
+
+  def canonical( self, songs: typing.Iterable[ dict ] ) -> list[ dict ]:
+    with self.lock:
+      return [ self.songs.setdefault( song[ "id" ], song ) for song in songs ]
+
+  def search( self, title: str ) -> list[ dict ] | None:
+    with self.lock:
+      key = search_key( title )
+      if key not in self.searches and self.catalog is not None:
+        self.searches[ key ] = self.catalog.find( title )
+      return self.searches.get( key )
+
+  def store_search( self, title: str, songs: typing.Iterable[ dict ] ) -> list[ dict ]:
+    with self.lock:
+      self.make_room()
+      key = search_key( title )
+      return self.searches.setdefault( key, self.merge( songs, key ) )
+
+  def store_catalog( self, songs: typing.Iterable[ dict ] ):
+    with self.lock:
+      self.make_room()
+      if self.catalog is None:
+        self.catalog = NameIndex( self.merge( songs ) )
+
+  def add_song( self, song: dict ) -> dict:
+    with self.lock:
+      self.make_room()
+      known = song[ "id" ] in self.songs
+      song = self.songs.setdefault( song[ "id" ], song )
+      if self.resolves and not known:
+        self.recent.append( song )
+      name = search_key( song.get( "name", "" ) )
+      for key, songs in self.searches.items():
+        if key in name and all( s is not song for s in songs ):
+          songs.append( song )
+      if self.catalog is not None and not known:
+        self.catalog.add( song )
+      return song
+
+  def forget_song( self, song_id: int ):
+    with self.lock:
+      if song := self.songs.pop( song_id, None ):
+        for songs in self.searches.values():
+          songs[ : ] = [ s for s in songs if s is not song ]
+        if self.catalog is not None:
+          self.catalog.remove( song )
+
+  def arrangements( self, song: dict ) -> list[ dict ] | None:
+    with self.lock:
+      return song.get( "arrangements" )
+
+  def store_arrangements( self, song: dict, arrangements: list[ dict ] ) -> list[ dict ]:
+    with self.lock:
+      return song.setdefault( "arrangements", arrangements )
+
+  def add_arrangement( self, song: dict, arrangement: dict ):
+    with self.lock:
+      if ( arrangements := self.arrangements( song ) ) is not None:
+        if all( a.get( "id" ) != arrangement.get( "id" ) for a in arrangements ):
+          arrangements.append( arrangement )
+
+  def forget_arrangement( self, song_id: int, arrangement_id: int ):
+    with self.lock:
+      if ( song := self.songs.get( song_id ) ) and ( arrangements := self.arrangements( song ) ) is not None:
+        arrangements[ : ] = [ a for a in arrangements if a.get( "id" ) != arrangement_id ]
+
+  def attachments( self, arrangement: dict ) -> list[ dict ] | None:
+    with self.lock:
+      if arrangement[ "id" ] in self.listed:
+        return arrangement.get( "files", [] )
+
+  def store_attachments( self, arrangement: dict, files: list[ dict ] ) -> list[ dict ]:
+    with self.lock:
+      arrangement[ "files" ] = files
+      self.listed.add( arrangement[ "id" ] )
+      return files
+
+  def add_attachment( self, arrangement: dict, file: dict ):
+    with self.lock:
+      arrangement.setdefault( "files", [] ).append( file )
+
+  def forget_attachment( self, arrangement: dict, file_id: int ):
+    with self.lock:
+      arrangement[ "files" ] = [ f for f in arrangement.get( "files", [] ) if f.get( "id" ) != file_id ]
@@ -0,0 +1,131 @@
+from .cache import RunCache
+
+
+class TestRunCache:
+
+  def test_unknown_search( self ):
+    cache = RunCache()
+    assert cache.search( "Amazing Grace" ) is None
+
+  def test_negative_search( self ):
+    cache = RunCache()
+    cache.store_search( "Amazing Grace", [] )
+    assert cache.search( "amazing grace" ) == []
+
+  def test_canonical( self ):
+    cache = RunCache()
+    first = cache.store_search( "Amazing", [ { "id": 1, "name": "Amazing Grace" } ] )
+    second = cache.store_search( "Grace", [ { "id": 1, "name": "Amazing Grace" }, { "id": 2, "name": "Grace Alone" } ] )
+    assert first[ 0 ] is second[ 0 ]
+    assert cache.songs[ 2 ] is second[ 1 ]
+
+  def test_catalog( self ):
+    cache = RunCache()
+    cache.store_catalog( [ { "id": 1, "name": "Amazing Grace" }, { "id": 2, "name": "Grace Alone" } ] )
+    assert [ s[ "id" ] for s in cache.search( "grace" ) ] == [ 1, 2 ]
+    assert cache.search( "How Great Thou Art" ) == []
+
+  def test_add_song( self ):
+    cache = RunCache()
+    cache.store_search( "Amazing Grace", [] )
+    cache.store_search( "How Great", [] )
+    song = cache.add_song( { "id": 1, "name": "Amazing Grace" } )
+    assert cache.search( "Amazing Grace" ) == [ song ]
+    assert cache.search( "How Great" ) == []
+    assert cache.add_song( { "id": 1, "name": "Amazing Grace" } ) is song
+    assert cache.search( "Amazing Grace" ) == [ song ]
+
+  def test_add_song_to_catalog( self ):
+    cache = RunCache()
+    cache.store_catalog( [] )
+    song = cache.add_song( { "id": 1, "name": "Amazing Grace" } )
+    assert cache.search( "grace" ) == [ song ]
+
+  def test_forget_song( self ):
+    cache = RunCache()
+    cache.store_catalog( [ { "id": 1, "name": "Amazing Grace" } ] )
+    cache.store_search( "Amazing", [ { "id": 1, "name": "Amazing Grace" } ] )
+    cache.forget_song( 1 )
+    assert cache.search( "Amazing" ) == []
+    assert cache.search( "Grace" ) == []
+    assert 1 not in cache.songs
+
+  def test_arrangements( self ):
+    cache = RunCache()
+    song = cache.add_song( { "id": 1, "name": "Amazing Grace" } )
+    assert cache.arrangements( song ) is None
+
+    arrangements = cache.store_arrangements( song, [ { "id": 10 } ] )
+    assert song[ "arrangements" ] is arrangements
+
+    cache.add_arrangement( song, { "id": 11 } )
+    cache.add_arrangement( song, { "id": 11 } )
+    assert [ a[ "id" ] for a in cache.arrangements( song ) ] == [ 10, 11 ]
+
+    cache.forget_arrangement( 1, 10 )
+    assert [ a[ "id" ] for a in cache.arrangements( song ) ] == [ 11 ]
+
+  def test_add_arrangement_unknown( self ):
+    cache = RunCache()
+    song = { "id": 1, "name": "Amazing Grace" }
+    cache.add_arrangement( song, { "id": 10 } )
+    assert cache.arrangements( song ) is None
+
+  def test_limit( self ):
+    cache = RunCache( limit=2 )
+    cache.store_search( "Amazing", [ { "id": 1, "name": "Amazing Grace" }, { "id": 2, "name": "Amazing Love" } ] )
+    assert len( cache.songs ) == 2
+
+    songs = cache.store_search( "Holy", [ { "id": 3, "name": "Holy Holy Holy" } ] )
+    assert cache.search( "Holy" ) is songs
+    assert cache.search( "Amazing" ) is None
+    assert list( cache.songs ) == [ 3 ]
+
+  def test_stale_search( self ):
+    cache = RunCache()
+    with cache.resolving():
+      song = cache.add_song( { "id": 1, "name": "Amazing Grace" } )
+      assert cache.store_search( "Grace", [] ) == [ song ]
+      assert cache.store_search( "Holy", [] ) == []
+    assert cache.recent == []
+
+  def test_stale_search_forgotten( self ):
+    cache = RunCache()
+    with cache.resolving():
+      cache.add_song( { "id": 1, "name": "Amazing Grace" } )
+      cache.forget_song( 1 )
+      assert cache.store_search( "Grace", [] ) == []
+
+  def test_stale_catalog( self ):
+    cache = RunCache()
+    with cache.resolving():
+      cache.add_song( { "id": 1, "name": "Amazing Grace" } )
+      cache.store_catalog( [ { "id": 2, "name": "Grace Alone" } ] )
+    assert [ s[ "id" ] for s in cache.search( "grace" ) ] == [ 2, 1 ]
+
+  def test_limit_while_resolving( self ):
+    cache = RunCache( limit=1 )
+    with cache.resolving():
+      cache.store_search( "Holy", [ { "id": 1, "name": "Holy Holy Holy" } ] )
+      song = cache.add_song( { "id": 2, "name": "Amazing Grace" } )
+      assert cache.store_search( "Amazing", [] ) == [ song ]
+    assert cache.songs == {}
+
+  def test_clear( self ):
+    cache = RunCache()
+    cache.store_catalog( [ { "id": 1, "name": "Amazing Grace" } ] )
+    cache.clear()
+    assert cache.search( "Grace" ) is None
+    assert cache.songs == {}
+
+  def test_attachments( self ):
+    cache = RunCache()
+    arrangement = { "id": 10, "files": [ { "id": 100, "name": "stale.sng" } ] }
+    assert cache.attachments( arrangement ) is None
+
+    cache.store_attachments( arrangement, [ { "id": 101, "name": "song.sng" } ] )
+    cache.add_attachment( arrangement, { "id": 102, "name": "other.sng" } )
+    assert [ f[ "id" ] for f in cache.attachments( arrangement ) ] == [ 101, 102 ]
+
+    cache.forget_attachment( arrangement, 101 )
+    assert [ f[ "id" ] for f in cache.attachments( arrangement ) ] == [ 102 ]
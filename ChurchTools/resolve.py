@@ -0,0 +1,87 @@
+import bisect
+import os
+import typing
+
+
+# The ChurchTools song search matches names case-insensitively by substring.
+# Every helper here mimics that, so a listing for a shorter query can be narrowed down locally.
+
+def search_key( title: str ) -> str:
+  return title.casefold()
+
+
+def name_matches( title: str, name: str ) -> bool:
+  return search_key( title ) in search_key( name )
+
+
+def plan_searches( titles: typing.Iterable[ str ], *, prefix_length: int = 6 ) -> dict[ str, list[ str ] ]:
+
+  groups: dict[ str, list[ str ] ] = {}
+  for title in titles:
+    groups.setdefault( title.lower()[ :prefix_length ], [] ).append( title )
+
+  plan: dict[ str, list[ str ] ] = {}
+  for group in groups.values():
+    if len( group ) == 1:
+      query = group[ 0 ]
+    else:
+      query = os.path.commonprefix( [ title.lower() for title in group ] ).strip()
+      if len( query ) < min( prefix_length, *( len( title ) for title in group ) ):
+        query = ""
+    if query:
+      plan.setdefault( query, [] ).extend( group )
+    else:
+      for title in group:
+        plan.setdefault( title, [] ).append( title )
+
+  return plan
+
+
+class NameIndex:
+
+  separator: str = "\n"
+
+  def __init__( self, songs: typing.Iterable[ dict ] ) -> None:
+    self.songs: list[ dict ] = []
+    self.offsets: list[ int ] = []
+    self.removed: set[ int ] = set()
+
+    names: list[ str ] = []
+    offset = 0
+    for song in songs:
+      name = self.key( song )
+      self.songs.append( song )
+      self.offsets.append( offset )
+      names.append( name )
+      offset += len( name ) + len( self.separator )
+
+    self.text: str = self.separator.join( names ) + self.separator
+
+  def key( self, song: dict ) -> str:
+    return search_key( song.get( "name", "" ).replace( self.separator, " " ) )
+
+  def add( self, song: dict ):
+    self.songs.append( song )
+    self.offsets.append( len( self.text ) )
+    self.text += self.key( song ) + self.separator
+
+  def remove( self, song: dict ):
+    self.removed.update( index for index, s in enumerate( self.songs ) if s is song )
+
+  def find( self, title: str ) -> list[ dict ]:
+    key = search_key( title )
+    if not key or self.separator in key:
+      return []
+
+    found: list[ dict ] = []
+    position = self.text.find( key )
+    while position >= 0:
+      index = bisect.bisect_right( self.offsets, position ) - 1
+      if index not in self.removed:
+        found.append( self.songs[ index ] )
+      if index + 1 < len( self.offsets ):
+        position = self.text.find( key, self.offsets[ index + 1 ] )
+      else:
+        break
+
+    return found
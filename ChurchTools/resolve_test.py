@@ -0,0 +1,84 @@
+from .resolve import search_key, name_matches, plan_searches, NameIndex
+
+
+class TestNameMatches:
+
+  def test_exact( self ):
+    assert name_matches( "Amazing Grace", "Amazing Grace" )
+
+  def test_case( self ):
+    assert name_matches( "amazing GRACE", "Amazing Grace" )
+    assert search_key( "Straße" ) == search_key( "STRASSE" )
+
+  def test_substring( self ):
+    assert name_matches( "Grace", "Amazing Grace (My Chains Are Gone)" )
+    assert not name_matches( "Amazing Love", "Amazing Grace" )
+
+
+class TestPlanSearches:
+
+  def test_single( self ):
+    assert plan_searches( [ "Amazing Grace" ] ) == { "Amazing Grace": [ "Amazing Grace" ] }
+
+  def test_shared_prefix( self ):
+    titles = [ "Amazing Grace", "Amazing Love", "How Great Thou Art" ]
+    assert plan_searches( titles ) == { "amazing": [ "Amazing Grace", "Amazing Love" ], "How Great Thou Art": [ "How Great Thou Art" ] }
+
+  def test_prefix_length( self ):
+    titles = [ "Amazing Grace", "Amazing Love" ]
+    assert plan_searches( titles, prefix_length=10 ) == { "Amazing Grace": [ "Amazing Grace" ], "Amazing Love": [ "Amazing Love" ] }
+
+  def test_covers_all_titles( self ):
+    titles = [ "Holy Holy Holy", "Holy Spirit", "Holy", "Here I Am", "Here I Am To Worship" ]
+    plan = plan_searches( titles, prefix_length=4 )
+    assert sorted( title for group in plan.values() for title in group ) == sorted( titles )
+    for query, group in plan.items():
+      assert all( name_matches( query, title ) for title in group )
+
+
+class TestNameIndex:
+
+  songs = [
+    { "id": 1, "name": "Amazing Grace" },
+    { "id": 2, "name": "Amazing Grace (My Chains Are Gone)" },
+    { "id": 3, "name": "Amazing Love" },
+    { "id": 4, "name": "Grace Alone" },
+  ]
+
+  def test_find( self ):
+    index = NameIndex( self.songs )
+    assert [ s[ "id" ] for s in index.find( "amazing grace" ) ] == [ 1, 2 ]
+    assert [ s[ "id" ] for s in index.find( "Grace" ) ] == [ 1, 2, 4 ]
+    assert [ s[ "id" ] for s in index.find( "Love" ) ] == [ 3 ]
+
+  def test_not_found( self ):
+    index = NameIndex( self.songs )
+    assert index.find( "How Great Thou Art" ) == []
+    assert index.find( "" ) == []
+    assert index.find( "Grace\nGrace" ) == []
+
+  def test_repeated_match( self ):
+    index = NameIndex( [ { "id": 1, "name": "Holy Holy Holy" }, { "id": 2, "name": "Holy" } ] )
+    assert [ s[ "id" ] for s in index.find( "holy" ) ] == [ 1, 2 ]
+
+  def test_agrees_with_name_matches( self ):
+    index = NameIndex( self.songs )
+    for title in [ "a", "Grace", "e A", "Gone)", "zing L" ]:
+      assert index.find( title ) == [ s for s in self.songs if name_matches( title, s[ "name" ] ) ]
+
+  def test_add( self ):
+    index = NameIndex( self.songs )
+    index.add( { "id": 5, "name": "Your Grace Is Enough" } )
+    assert [ s[ "id" ] for s in index.find( "grace" ) ] == [ 1, 2, 4, 5 ]
+    assert [ s[ "id" ] for s in index.find( "enough" ) ] == [ 5 ]
+
+  def test_empty( self ):
+    index = NameIndex( [] )
+    assert index.find( "Grace" ) == []
+    index.add( { "id": 1, "name": "Grace" } )
+    assert [ s[ "id" ] for s in index.find( "Grace" ) ] == [ 1 ]
+
+  def test_remove( self ):
+    index = NameIndex( self.songs )
+    index.remove( self.songs[ 1 ] )
+    assert [ s[ "id" ] for s in index.find( "grace" ) ] == [ 1, 4 ]
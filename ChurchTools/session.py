@@ -1,5 +1,6 @@
 import requests
 import getpass
+import typing
 
 
 def has_more_pages( result: dict ) -> bool:
@@ -42,7 +43,7 @@ class Session( requests.Session ):
     else:
       raise ConnectionError( f"Failed to login to '{ self.api_url }' as user '{ username }': { result.status_code } - { result.text }" )
 
-  def collect( self, template: requests.Request, *, page_size: int | None = None, start_page: int = 1 ) -> list:
+  def iterate( self, template: requests.Request, *, page_size: int | None = None, start_page: int = 1 ) -> typing.Iterator:
 
     template.params[ "page" ] = start_page
     if limit := page_size or self.default_page_size:
@@ -50,17 +51,18 @@ class Session( requests.Session ):
 
     if result := self.send( self.prepare_request( template ) ):
       json = result.json()
-      pages: list = json[ "data" ]
+      yield from json[ "data" ]
 
       while has_more_pages( json ):
         template.params[ "page" ] = json[ "meta" ][ "pagination" ][ "current" ] + 1
         if result := self.send( self.prepare_request( template ) ):
           json = result.json()
-          pages.extend( json[ "data" ] )
+          yield from json[ "data" ]
         else:
           raise ConnectionError( f"Failed to load additional pages: { result.status_code } - { result.text }" )
 
-      return pages
-
     else:
       raise ConnectionError( f"Failed to load data: { result.status_code } - { result.text }" )
+
+  def collect( self, template: requests.Request, *, page_size: int | None = None, start_page: int = 1 ) -> list:
+    return list( self.iterate( template, page_size=page_size, start_page=start_page ) )
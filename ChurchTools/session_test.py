@@ -1,3 +1,8 @@
+import unittest.mock
+
+import pytest
+import requests
+
 from .session import join_path, has_more_pages, Session
 
 
@@ -63,3 +68,31 @@ class TestSession:
     endpoint = "some/endpoint"
 
     assert session.endpoint_url( endpoint ) == url + endpoint
+
+  def test_iterate( self ):
+
+    url = "test://church.tools.local/"
+    session = Session( url )
+
+    pages = [
+      { "data": [ 1, 2 ], "meta": { "pagination": { "current": 1, "lastPage": 2 } } },
+      { "data": [ 3 ], "meta": { "pagination": { "current": 2, "lastPage": 2 } } },
+    ]
+    responses = [ unittest.mock.MagicMock( **{ "json.return_value": page, "__bool__.return_value": True } ) for page in pages ]
+
+    with unittest.mock.patch.object( session, "send", side_effect=responses ) as send:
+      items = session.iterate( requests.Request( "GET", url + "songs" ), page_size=2 )
+      assert next( items ) == 1
+      assert send.call_count == 1
+      assert list( items ) == [ 2, 3 ]
+      assert send.call_count == 2
+
+  def test_collect_failure( self ):
+
+    url = "test://church.tools.local/"
+    session = Session( url )
+    response = unittest.mock.MagicMock( status_code=500, text="error", **{ "__bool__.return_value": False } )
+
+    with unittest.mock.patch.object( session, "send", return_value=response ):
+      with pytest.raises( ConnectionError ):
+        session.collect( requests.Request( "GET", url + "songs" ) )
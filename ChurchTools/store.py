@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import time
+import typing
+
+import requests.cookies
+
+
+def default_directory() -> str:
+  return os.path.join( os.environ.get( "XDG_CACHE_HOME" ) or os.path.expanduser( "~/.cache" ), "church-tools" )
+
+
+def export_cookies( jar: requests.cookies.RequestsCookieJar ) -> list[ dict ]:
+  return [
+    { "name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expires": c.expires, "secure": c.secure }
+    for c in jar
+  ]
+
+
+def import_cookies( jar: requests.cookies.RequestsCookieJar, cookies: typing.Iterable[ dict ] ):
+  now = time.time()
+  for c in cookies:
+    if c.get( "expires" ) is None or c[ "expires" ] > now:
+      jar.set( c[ "name" ], c[ "value" ], domain=c.get( "domain", "" ), path=c.get( "path", "/" ), expires=c.get( "expires" ), secure=c.get( "secure", False ) )
+
+
+class SessionStore:
+
+  def __init__( self, api_url: str, user: str | None = None, *, directory: str | None = None ) -> None:
+    self.api_url: str = api_url
+    self.user: str | None = user
+    self.directory: str = directory or default_directory()
+
+    key = hashlib.sha256( f"{ api_url }\0{ user or '' }".encode() ).hexdigest()[ :16 ]
+    self.path: str = os.path.join( self.directory, f"session-{ key }.json" )
+
+  def load( self ) -> dict | None:
+    try:
+      with open( self.path, "r", encoding="utf8" ) as file:
+        state = json.load( file )
+    except ( OSError, ValueError ):
+      return None
+
+    if isinstance( state, dict ) and state.get( "api_url" ) == self.api_url and state.get( "user" ) == self.user:
+      return state
+    else:
+      return None
+
+  def save( self, cookies: list[ dict ], csrf_token: str | None ):
+    os.makedirs( self.directory, mode=0o700, exist_ok=True )
+
+    state = { "api_url": self.api_url, "user": self.user, "cookies": cookies, "csrf_token": csrf_token, "saved": time.time() }
+
+    partial = f"{ self.path }.{ os.getpid() }"
+    fd = os.open( partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600 )
+    try:
+      with os.fdopen( fd, "w", encoding="utf8" ) as file:
+        json.dump( state, file )
+      os.replace( partial, self.path )
+    except BaseException:
+      if os.path.exists( partial ):
+        os.remove( partial )
+      raise
+
+  def clear( self ):
+    try:
+      os.remove( self.path )
+    except FileNotFoundError:
+      pass
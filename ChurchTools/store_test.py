@@ -0,0 +1,69 @@
+import os
+import stat
+import time
+
+import requests.cookies
+
+from .store import SessionStore, export_cookies, import_cookies
+
+
+class TestCookies:
+
+  def test_round_trip( self ):
+    jar = requests.cookies.RequestsCookieJar()
+    jar.set( "ChurchTools_session", "secret", domain="church.tools.local", path="/" )
+
+    restored = requests.cookies.RequestsCookieJar()
+    import_cookies( restored, export_cookies( jar ) )
+
+    assert restored.get( "ChurchTools_session", domain="church.tools.local" ) == "secret"
+
+  def test_expired( self ):
+    restored = requests.cookies.RequestsCookieJar()
+    import_cookies( restored, [ { "name": "old", "value": "stale", "expires": int( time.time() ) - 60 } ] )
+    assert len( restored ) == 0
+
+
+class TestSessionStore:
+
+  url = "test://church.tools.local/api"
+
+  def test_missing( self, tmp_path ):
+    assert SessionStore( self.url, "user", directory=str( tmp_path ) ).load() is None
+
+  def test_round_trip( self, tmp_path ):
+    store = SessionStore( self.url, "user", directory=str( tmp_path / "cache" ) )
+    cookies = [ { "name": "session", "value": "secret" } ]
+    store.save( cookies, "token" )
+
+    state = store.load()
+    assert state[ "cookies" ] == cookies
+    assert state[ "csrf_token" ] == "token"
+
+  def test_permissions( self, tmp_path ):
+    store = SessionStore( self.url, "user", directory=str( tmp_path / "cache" ) )
+    store.save( [], "token" )
+
+    assert stat.S_IMODE( os.stat( store.path ).st_mode ) == 0o600
+    assert stat.S_IMODE( os.stat( store.directory ).st_mode ) == 0o700
+
+  def test_separate_users( self, tmp_path ):
+    first = SessionStore( self.url, "first", directory=str( tmp_path ) )
+    second = SessionStore( self.url, "second", directory=str( tmp_path ) )
+    first.save( [], "token" )
+
+    assert first.path != second.path
+    assert second.load() is None
+
+  def test_corrupt( self, tmp_path ):
+    store = SessionStore( self.url, None, directory=str( tmp_path ) )
+    with open( store.path, "w" ) as file:
+      file.write( "{ not json" )
+    assert store.load() is None
+
+  def test_clear( self, tmp_path ):
+    store = SessionStore( self.url, None, directory=str( tmp_path ) )
+    store.save( [], "token" )
+    store.clear()
+    store.clear()
+    assert store.load() is None
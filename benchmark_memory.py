@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import argparse
+import itertools
+import json
+import os
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import urllib.parse
+
+import find_duplicates
+
+script_directory = os.path.dirname( os.path.abspath( __file__ ) )
+
+
+# Titles start with the number so that a batch of them does not share one long common prefix, as real titles rarely do.
+def song_title( number: int ) -> str:
+  return f"{ number:07} Generated Song"
+
+
+def generate_library( directory: str, count: int, *, duplicate_every: int = 10 ):
+  for i in range( count ):
+    title = song_title( i - 1 if i % duplicate_every == 1 else i )
+    with open( os.path.join( directory, f"song-{ i:07}.sng" ), "w", encoding="utf8" ) as file:
+      file.write( f"#LangCount=1\n#Title={ title }\n#Author=Author { i % 997 }\n#CCLI={ 1000000 + i }\n#Key=G\n---\nVerse 1\nLine one of { title }\nLine two\n" )
+
+
+# VmHWM starts over at exec, unlike ru_maxrss which also counts the forked parent.
+def own_peak_memory() -> int:
+  try:
+    with open( "/proc/self/status", "r" ) as status:
+      for line in status:
+        if line.startswith( "VmHWM:" ):
+          return int( line.split()[ 1 ] ) * 1024
+  except FileNotFoundError:
+    pass
+  usage = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+  return usage if sys.platform == "darwin" else usage * 1024
+
+
+def peak_memory( *command: str, offline: int | None = None ) -> int:
+  result = subprocess.run(
+    [ sys.executable, "benchmark_memory.py", *( [ "--offline", str( offline ) ] if offline is not None else [] ), "--measure", *command ],
+    cwd=script_directory, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+  )
+  if result.returncode:
+    raise RuntimeError( f"Benchmark command failed with exit code { result.returncode }: { ' '.join( command ) }\n{ result.stderr }" )
+  return int( result.stderr.splitlines()[ -1 ] )
+
+
+def measure( script: str, *arguments: str ):
+  sys.argv = [ script, *arguments ]
+  try:
+    runpy.run_path( script, run_name="__main__" )
+  except SystemExit as exit:
+    if exit.code:
+      raise
+  print( own_peak_memory(), file=sys.stderr )
+
+
+# Answers ChurchTools requests for a catalog that already holds two of every three generated songs, each with an arrangement and its .sng file.
+# Everything is derived from the song number, so the stub keeps no state but an ID counter for what the import creates.
+def serve_offline( count: int ):
+  import requests
+  import requests.adapters
+
+  ids = itertools.count( 100000000 )
+  arrangement_ids = 10000000
+  file_ids = 20000000
+
+  def exists( number: int ) -> bool:
+    return 0 <= number < count and number % 3 != 2
+
+  def attachment( number: int ) -> dict:
+    return { "id": file_ids + number, "name": f"song-{ number:07}.sng", "size": 0, "fileUrl": f"https://church.tools.invalid/files/{ number }" }
+
+  def arrangement( number: int ) -> dict:
+    return { "id": arrangement_ids + number, "name": "SongBeamer", "key": "G", "files": [ attachment( number ) ] }
+
+  def song( number: int ) -> dict:
+    return {
+      "id": number + 1, "name": song_title( number ), "category": { "id": 0 }, "author": f"Author { number % 997 }", "ccli": str( 1000000 + number ),
+      "arrangements": [ arrangement( number ) ]
+    }
+
+  def search( query: str ) -> list[ dict ]:
+    digits = query[ :len( query ) - len( query.lstrip( "0123456789" ) ) ][ :7 ]
+    if not digits or not song_title( 0 )[ len( digits ): ].casefold().startswith( query[ len( digits ): ].casefold() ):
+      return []
+    scale = 10 ** ( 7 - len( digits ) )
+    return [ song( number ) for number in range( int( digits ) * scale, ( int( digits ) + 1 ) * scale ) if exists( number ) ]
+
+  def respond( request: requests.PreparedRequest, data ) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.request = request
+    response.url = request.url
+    response._content = json.dumps( { "data": data } ).encode()
+    return response
+
+  def send( adapter, request: requests.PreparedRequest, **kwargs ) -> requests.Response:
+    url = urllib.parse.urlsplit( request.url )
+    endpoint = url.path.split( "/" )[ 2: ]
+    match request.method, endpoint:
+      case "GET", [ "whoami" ]:
+        return respond( request, { "id": 1, "firstName": "Benchmark", "lastName": "User" } )
+      case "GET", [ "csrftoken" ]:
+        return respond( request, "token" )
+      case "GET", [ "songs" ]:
+        return respond( request, search( urllib.parse.parse_qs( url.query ).get( "name", [ "" ] )[ 0 ] ) )
+      case "GET", [ "songs", number, "arrangements" ] if exists( int( number ) - 1 ):
+        return respond( request, [ arrangement( int( number ) - 1 ) ] )
+      case "GET", [ "files", "song_arrangement", number ] if exists( int( number ) - arrangement_ids ):
+        return respond( request, [ attachment( int( number ) - arrangement_ids ) ] )
+      case "GET", _:
+        return respond( request, [] )
+      case "POST", [ "songs" ]:
+        return respond( request, { "id": next( ids ), "name": json.loads( request.body )[ "name" ], "category": { "id": 0 }, "arrangements": [] } )
+      case "POST", [ "songs", _, "arrangements" ]:
+        return respond( request, { "id": next( ids ), **json.loads( request.body ) } )
+      case "POST", [ "files", _, _ ]:
+        return respond( request, { "id": next( ids ) } )
+      case _:
+        return respond( request, None )
+
+  requests.adapters.HTTPAdapter.send = send
+
+
+if __name__ == "__main__":
+
+  parser = argparse.ArgumentParser( description="Verify the peak memory of bounded processing against a synthetic library of .sng files." )
+  parser.add_argument( "--files", type=int, default=100000, help="Number of .sng files to generate (default: 100000)", metavar="N" )
+  parser.add_argument( "--library", type=str, help="Use or fill this directory instead of a temporary one", metavar="DIR" )
+  parser.add_argument( "--offline", type=int, help=argparse.SUPPRESS, metavar="N" )
+  parser.add_argument( "--measure", nargs=argparse.REMAINDER, help=argparse.SUPPRESS )
+  arguments = parser.parse_args()
+
+  if arguments.measure:
+    if arguments.offline is not None:
+      serve_offline( arguments.offline )
+    measure( *arguments.measure )
+    sys.exit()
+
+  import song_import  # Imported this late so that it does not count towards the measured processes.
+
+  with tempfile.TemporaryDirectory() as temporary:
+    library = arguments.library or temporary
+    os.makedirs( library, exist_ok=True )
+    if len( os.listdir( library ) ) < arguments.files:
+      print( f"Generating { arguments.files } files in '{ library }'." )
+      generate_library( library, arguments.files )
+
+    api = [ "song_import.py", "--api-url", "https://church.tools.invalid/api", "--api-token", "benchmark", "--output", "quiet", "import" ]
+    measurements = {
+      "find_duplicates": ( peak_memory( "find_duplicates.py", library ), None ),
+      "find_duplicates --bounded": (
+        peak_memory( "find_duplicates.py", "--bounded", "--spill_directory", temporary, library ), find_duplicates.memory_ceiling
+      ),
+      "song_import import": ( peak_memory( *api, library, offline=arguments.files ), None ),
+      "song_import import --bounded": ( peak_memory( *api, "--bounded", library, offline=arguments.files ), song_import.memory_ceiling ),
+    }
+
+    failed = False
+    for name, ( peak, ceiling ) in measurements.items():
+      if ceiling is None:
+        verdict = "reference"
+      else:
+        verdict = f"{ 'ok' if peak <= ceiling else 'EXCEEDED' } (ceiling { ceiling / ( 1024 * 1024 ):.1f} MiB)"
+        failed |= peak > ceiling
+      print( f"{ name:<30} { peak / ( 1024 * 1024 ):8.1f} MiB  { verdict }" )
+
+    sys.exit( 1 if failed else 0 )
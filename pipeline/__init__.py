@@ -0,0 +1,8 @@
+"""The pipeline Package
+
+The pipeline package runs work as a sequence of stages connected by bounded queues.
+Each stage has its own pool of worker threads, so slow stages apply backpressure to the ones before them.
+Per-stage statistics show which stage is the bottleneck of a run.
+"""
+
+from .pipeline import Pipeline, Stage, format_stats
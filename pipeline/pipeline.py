@@ -0,0 +1,235 @@
+import queue
+import threading
+import time
+import typing
+
+
+_done = object()
+
+
+class Cancelled( Exception ):
+  pass
+
+
+class StageStats:
+
+  def __init__( self ) -> None:
+    self.processed: int = 0
+    self.produced: int = 0
+    self.busy: float = 0.0
+    self.blocked: float = 0.0
+    self.depth: int = 0
+    self.max_depth: int = 0
+    self.depth_total: int = 0
+    self.samples: int = 0
+
+  def mean_depth( self ) -> float:
+    return self.depth_total / self.samples if self.samples else 0.0
+
+  def sample( self, depth: int ):
+    self.depth = depth
+    self.max_depth = max( self.max_depth, depth )
+    self.depth_total += depth
+    self.samples += 1
+
+
+class Stage:
+
+  def __init__(
+    self, name: str, function: typing.Callable[ [ typing.Any ], typing.Iterable | None ], *, workers: int = 1, capacity: int = 0, batch_size: int | None = None
+  ) -> None:
+    if workers < 1:
+      raise ValueError( f"Stage '{ name }' needs at least one worker." )
+    if batch_size is not None and batch_size < 1:
+      raise ValueError( f"Stage '{ name }' needs a positive batch size." )
+
+    self.name: str = name
+    self.function = function
+    self.workers: int = workers
+    self.capacity: int = capacity
+    self.batch_size: int | None = batch_size
+    self.stats: StageStats = StageStats()
+    self.lock: threading.Lock = threading.Lock()
+
+  def utilisation( self, elapsed: float ) -> float:
+    return self.stats.busy / ( elapsed * self.workers ) if elapsed > 0 else 0.0
+
+
+class Pipeline:
+
+  poll_interval: float = 0.1
+
+  def __init__( self, *stages: Stage ) -> None:
+    if not stages:
+      raise ValueError( "A pipeline needs at least one stage." )
+
+    self.stages: tuple[ Stage, ... ] = stages
+    self.queues: list[ queue.Queue ] = []
+    self.started: float | None = None
+    self.finished: float | None = None
+    self._cancelled = threading.Event()
+    self._errors: list[ BaseException ] = []
+    self._remaining: list[ int ] = []
+
+  def elapsed( self ) -> float:
+    if self.started is None:
+      return 0.0
+    return ( self.finished or time.perf_counter() ) - self.started
+
+  def cancel( self ):
+    self._cancelled.set()
+
+  def run( self, source: typing.Iterable, *, report: typing.Callable[ [ "Pipeline" ], None ] | None = None, report_interval: float = 10.0 ):
+
+    self.queues = [ queue.Queue( maxsize=stage.capacity ) for stage in self.stages ]
+    self._remaining = [ stage.workers for stage in self.stages ]
+    self._cancelled.clear()
+    self._errors = []
+    for stage in self.stages:
+      stage.stats = StageStats()
+
+    self.started = time.perf_counter()
+    self.finished = None
+
+    threads = [ threading.Thread( target=self._guard, args=( self._feed, source ), name="pipeline-feed", daemon=True ) ]
+    for index, stage in enumerate( self.stages ):
+      for worker in range( stage.workers ):
+        threads.append( threading.Thread( target=self._guard, args=( self._work, index ), name=f"pipeline-{ stage.name }-{ worker }", daemon=True ) )
+
+    for thread in threads:
+      thread.start()
+
+    last_report = self.started
+    try:
+      while any( thread.is_alive() for thread in threads ):
+        threads[ -1 ].join( self.poll_interval )
+        self._sample()
+        if report and time.perf_counter() - last_report >= report_interval:
+          last_report = time.perf_counter()
+          report( self )
+    except BaseException:
+      self.cancel()
+      for thread in threads:
+        thread.join()
+      self.finished = time.perf_counter()
+      raise
+
+    self.finished = time.perf_counter()
+
+    if self._errors:
+      raise self._errors[ 0 ]
+
+  def _guard( self, target: typing.Callable, *args ):
+    try:
+      target( *args )
+    except Cancelled:
+      pass
+    except BaseException as error:
+      self._errors.append( error )
+      self.cancel()
+
+  def _sample( self ):
+    for stage, inbox in zip( self.stages, self.queues ):
+      with stage.lock:
+        stage.stats.sample( inbox.qsize() )
+
+  def _put( self, target: queue.Queue, item ):
+    while True:
+      if self._cancelled.is_set():
+        raise Cancelled()
+      try:
+        target.put( item, timeout=self.poll_interval )
+        return
+      except queue.Full:
+        pass
+
+  def _take( self, source: queue.Queue ):
+    while True:
+      if self._cancelled.is_set():
+        raise Cancelled()
+      try:
+        return source.get( timeout=self.poll_interval )
+      except queue.Empty:
+        pass
+
+  def _take_batch( self, source: queue.Queue, size: int ) -> list:
+    batch = [ self._take( source ) ]
+    while len( batch ) < size and batch[ -1 ] is not _done:
+      try:
+        batch.append( source.get( timeout=self.poll_interval ) )
+      except queue.Empty:
+        break
+    return batch
+
+  def _close( self, index: int ):
+    if index < len( self.stages ):
+      for _ in range( self.stages[ index ].workers ):
+        self._put( self.queues[ index ], _done )
+
+  def _feed( self, source: typing.Iterable ):
+    for item in source:
+      self._put( self.queues[ 0 ], item )
+    self._close( 0 )
+
+  def _work( self, index: int ):
+    stage = self.stages[ index ]
+    inbox = self.queues[ index ]
+    outbox = self.queues[ index + 1 ] if index + 1 < len( self.queues ) else None
+
+    while True:
+      if stage.batch_size:
+        item = self._take_batch( inbox, stage.batch_size )
+        if finished := item[ -1 ] is _done:
+          item.pop()
+        if not item:
+          break
+      else:
+        item = self._take( inbox )
+        if finished := item is _done:
+          break
+
+      busy = 0.0
+      blocked = 0.0
+      produced = 0
+
+      start = time.perf_counter()
+      for result in stage.function( item ) or ():
+        produced += 1
+        if outbox is not None:
+          waiting = time.perf_counter()
+          busy += waiting - start
+          self._put( outbox, result )
+          start = time.perf_counter()
+          blocked += start - waiting
+      busy += time.perf_counter() - start
+
+      with stage.lock:
+        stage.stats.processed += len( item ) if stage.batch_size else 1
+        stage.stats.produced += produced
+        stage.stats.busy += busy
+        stage.stats.blocked += blocked
+
+      if finished:
+        break
+
+    with stage.lock:
+      self._remaining[ index ] -= 1
+      last = self._remaining[ index ] == 0
+
+    if last:
+      self._close( index + 1 )
+
+
+def format_stats( pipeline: Pipeline ) -> str:
+  elapsed = pipeline.elapsed()
+  lines = [ f"{ 'stage':<10} { 'workers':>7} { 'items':>7} { 'busy':>6} { 'blocked':>7} { 'queue':>5} { 'mean':>6} { 'max':>5}" ]
+  for stage in pipeline.stages:
+    with stage.lock:
+      stats = stage.stats
+      blocked = stats.blocked / ( elapsed * stage.workers ) if elapsed > 0 else 0.0
+      lines.append(
+        f"{ stage.name:<10} { stage.workers:>7} { stats.processed:>7} { stage.utilisation( elapsed ):>6.1%} { blocked:>7.1%} "
+        f"{ stats.depth:>5} { stats.mean_depth():>6.1f} { stats.max_depth:>5}"
+      )
+  lines.append( f"Elapsed: { elapsed:.1f}s" )
+  return "\n".join( lines )
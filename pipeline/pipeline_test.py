@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pytest
+
+from .pipeline import Pipeline, Stage, StageStats, format_stats
+
+
+class TestStageStats:
+
+  def test_init( self ):
+    stats = StageStats()
+    assert stats.processed == 0
+    assert stats.busy == 0.0
+    assert stats.mean_depth() == 0.0
+
+  def test_sample( self ):
+    stats = StageStats()
+    for depth in ( 1, 4, 1 ):
+      stats.sample( depth )
+    assert stats.depth == 1
+    assert stats.max_depth == 4
+    assert stats.mean_depth() == 2.0
+
+
+class TestStage:
+
+  def test_invalid_workers( self ):
+    with pytest.raises( ValueError ):
+      Stage( "invalid", lambda item: None, workers=0 )
+    with pytest.raises( ValueError ):
+      Stage( "invalid", lambda item: None, batch_size=0 )
+
+  def test_utilisation( self ):
+    stage = Stage( "test", lambda item: None, workers=2 )
+    stage.stats.busy = 1.0
+    assert stage.utilisation( 1.0 ) == 0.5
+    assert stage.utilisation( 0.0 ) == 0.0
+
+
+class TestPipeline:
+
+  def test_no_stages( self ):
+    with pytest.raises( ValueError ):
+      Pipeline()
+
+  def test_run( self ):
+
+    results = []
+    lock = threading.Lock()
+
+    def collect( item ):
+      with lock:
+        results.append( item )
+
+    pipeline = Pipeline(
+      Stage( "split", lambda item: range( item ) ),
+      Stage( "square", lambda item: [ item * item ], workers=3, capacity=2 ),
+      Stage( "filter", lambda item: [ item ] if item % 2 else None, capacity=1 ),
+      Stage( "collect", collect ),
+    )
+    pipeline.run( [ 3, 4 ] )
+
+    assert sorted( results ) == [ 1, 1, 9 ]
+    assert [ stage.stats.processed for stage in pipeline.stages ] == [ 2, 7, 7, 3 ]
+    assert [ stage.stats.produced for stage in pipeline.stages ] == [ 7, 7, 3, 0 ]
+
+  def test_error( self ):
+
+    def fail( item ):
+      if item == 3:
+        raise RuntimeError( "failed" )
+      return [ item ]
+
+    pipeline = Pipeline( Stage( "fail", fail, capacity=1 ), Stage( "sink", lambda item: None, capacity=1 ) )
+    with pytest.raises( RuntimeError ):
+      pipeline.run( range( 100 ) )
+
+  def test_backpressure( self ):
+
+    def slow( item ):
+      time.sleep( 0.01 )
+
+    pipeline = Pipeline( Stage( "fast", lambda item: [ item ] ), Stage( "slow", slow, capacity=1 ) )
+    pipeline.run( range( 10 ) )
+
+    fast, slow = pipeline.stages
+    assert fast.stats.blocked > 0.0
+    assert slow.utilisation( pipeline.elapsed() ) > fast.utilisation( pipeline.elapsed() )
+    assert slow.stats.max_depth <= 1
+
+  def test_report( self ):
+
+    reports = []
+    pipeline = Pipeline( Stage( "sleep", lambda item: time.sleep( 0.05 ) ) )
+    pipeline.run( range( 4 ), report=reports.append, report_interval=0.0 )
+
+    assert reports
+    assert all( report is pipeline for report in reports )
+
+  def test_format_stats( self ):
+    pipeline = Pipeline( Stage( "first", lambda item: [ item ] ), Stage( "second", lambda item: None ) )
+    pipeline.run( range( 3 ) )
+
+    lines = format_stats( pipeline ).splitlines()
+    assert len( lines ) == 4
+    assert lines[ 1 ].startswith( "first" )
+    assert lines[ 2 ].startswith( "second" )
+
+  def test_batches( self ):
+
+    batches = []
+    lock = threading.Lock()
+
+    def collect( batch ):
+      with lock:
+        batches.append( batch )
+      return batch
+
+    pipeline = Pipeline( Stage( "batch", collect, batch_size=4 ), Stage( "sink", lambda item: None ) )
+    pipeline.run( range( 10 ) )
+
+    assert sorted( item for batch in batches for item in batch ) == list( range( 10 ) )
+    assert all( 0 < len( batch ) <= 4 for batch in batches )
+    assert pipeline.stages[ 0 ].stats.processed == 10
+    assert pipeline.stages[ 1 ].stats.processed == 10
+
+  def test_interrupted( self ):
+
+    started = threading.Event()
+    finished = []
+
+    def slow( item ):
+      started.set()
+      time.sleep( 0.05 )
+      finished.append( item )
+
+    def report( pipeline ):
+      if started.is_set():
+        raise KeyboardInterrupt()
+
+    pipeline = Pipeline( Stage( "slow", slow, workers=2 ) )
+    with pytest.raises( KeyboardInterrupt ):
+      pipeline.run( range( 100 ), report=report, report_interval=0.0 )
+
+    count = len( finished )
+    time.sleep( 0.1 )
+    assert len( finished ) == count
+    assert count < 100
@@ -0,0 +1,7 @@
+"""The report Package
+
+The report package collects progress events of long running operations and writes them in different formats.
+Reporters are safe to share between threads and buffer their output, so reporting does not slow down the work itself.
+"""
+
+from .report import Reporter, QuietReporter, TextReporter, JsonReporter, ProgressReporter, reporters
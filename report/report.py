@@ -0,0 +1,162 @@
+import contextlib
+import json
+import sys
+import threading
+import time
+import typing
+
+from pipeline import Pipeline, format_stats
+
+
+class Reporter:
+
+  def event( self, kind: str, message: str, **fields ):
+    pass
+
+  @contextlib.contextmanager
+  def operation( self, kind: str, message: str, **fields ) -> typing.Iterator[ dict ]:
+    start = time.perf_counter()
+    try:
+      yield fields
+    except Exception as error:
+      self.event( kind, message, **fields, duration=time.perf_counter() - start, error=str( error ) )
+      raise
+    self.event( kind, message, **fields, duration=time.perf_counter() - start )
+
+  def stats( self, pipeline: Pipeline ):
+    pass
+
+  def flush( self ):
+    pass
+
+  def close( self ):
+    self.flush()
+
+  def __enter__( self ) -> "Reporter":
+    return self
+
+  def __exit__( self, *exception ):
+    self.close()
+
+
+class QuietReporter( Reporter ):
+  pass
+
+
+class StreamReporter( Reporter ):
+
+  buffer_size: int = 64
+  flush_interval: float = 1.0
+
+  def __init__( self, stream: typing.TextIO | None = None ) -> None:
+    self.stream: typing.TextIO = stream or sys.stdout
+    self.lock: threading.Lock = threading.Lock()
+    self.buffer: list[ str ] = []
+    self.flushed: float = time.monotonic()
+
+  def write( self, line: str ):
+    with self.lock:
+      self.buffer.append( line )
+      if len( self.buffer ) >= self.buffer_size or time.monotonic() - self.flushed >= self.flush_interval:
+        self._flush()
+
+  def flush( self ):
+    with self.lock:
+      self._flush()
+
+  def _flush( self ):
+    if self.buffer:
+      self.stream.write( "".join( line + "\n" for line in self.buffer ) )
+      self.buffer.clear()
+    self.stream.flush()
+    self.flushed = time.monotonic()
+
+
+class TextReporter( StreamReporter ):
+
+  def event( self, kind: str, message: str, **fields ):
+    if error := fields.get( "error" ):
+      message = f"{ message } Failed: { error }"
+    if file := fields.get( "file" ):
+      message = f"[{ file }] { message }"
+    self.write( message )
+
+  def stats( self, pipeline: Pipeline ):
+    self.write( format_stats( pipeline ) )
+
+
+class JsonReporter( StreamReporter ):
+
+  def event( self, kind: str, message: str, **fields ):
+    self.write( json.dumps( { "time": time.time(), "event": kind, "message": message, **fields }, default=str ) )
+
+  def stats( self, pipeline: Pipeline ):
+    elapsed = pipeline.elapsed()
+    for stage in pipeline.stages:
+      with stage.lock:
+        self.event(
+          "pipeline.stage", f"Stage { stage.name }",
+          stage=stage.name, workers=stage.workers, processed=stage.stats.processed, produced=stage.stats.produced,
+          utilisation=stage.utilisation( elapsed ), busy=stage.stats.busy, blocked=stage.stats.blocked,
+          depth=stage.stats.depth, mean_depth=stage.stats.mean_depth(), max_depth=stage.stats.max_depth, elapsed=elapsed
+        )
+
+
+class ProgressReporter( StreamReporter ):
+
+  refresh_interval: float = 0.5
+
+  def __init__( self, stream: typing.TextIO | None = None ) -> None:
+    super().__init__( stream or sys.stderr )
+    self.counts: dict[ str, int ] = {}
+    self.errors: int = 0
+    self.started: float = time.monotonic()
+    self.refreshed: float = 0.0
+    self.status: str = ""
+
+  def line( self ) -> str:
+    counts = ", ".join( f"{ kind }: { count }" for kind, count in sorted( self.counts.items() ) )
+    line = f"{ time.monotonic() - self.started:.0f}s { counts or 'waiting' }"
+    if self.errors:
+      line += f", errors: { self.errors }"
+    return line
+
+  def event( self, kind: str, message: str, **fields ):
+    with self.lock:
+      self.counts[ kind ] = self.counts.get( kind, 0 ) + 1
+      if "error" in fields:
+        self.errors += 1
+      if time.monotonic() - self.refreshed >= self.refresh_interval:
+        self._refresh()
+
+  def stats( self, pipeline: Pipeline ):
+    with self.lock:
+      self.status = ""
+      self.stream.write( "\r\033[K" + format_stats( pipeline ) + "\n" )
+      self._refresh()
+
+  def flush( self ):
+    with self.lock:
+      self._refresh()
+
+  def close( self ):
+    with self.lock:
+      self._refresh()
+      if self.status:
+        self.stream.write( "\n" )
+        self.status = ""
+      self.stream.flush()
+
+  def _refresh( self ):
+    self.status = self.line()
+    self.stream.write( "\r\033[K" + self.status )
+    self.stream.flush()
+    self.refreshed = time.monotonic()
+
+
+reporters: dict[ str, type[ Reporter ] ] = {
+  "text": TextReporter,
+  "quiet": QuietReporter,
+  "json": JsonReporter,
+  "progress": ProgressReporter,
+}
@@ -0,0 +1,138 @@
+import io
+import json
+
+import pytest
+
+from pipeline import Pipeline, Stage
+from .report import Reporter, QuietReporter, TextReporter, JsonReporter, ProgressReporter, reporters
+
+
+class Recorder( Reporter ):
+
+  def __init__( self ) -> None:
+    self.events: list[ tuple[ str, str, dict ] ] = []
+
+  def event( self, kind: str, message: str, **fields ):
+    self.events.append( ( kind, message, fields ) )
+
+
+def run_pipeline() -> Pipeline:
+  pipeline = Pipeline( Stage( "only", lambda item: None ) )
+  pipeline.run( range( 3 ) )
+  return pipeline
+
+
+class TestReporter:
+
+  def test_operation( self ):
+    reporter = Recorder()
+    with reporter.operation( "song.create", "Creating song.", id=1 ) as fields:
+      fields[ "name" ] = "Amazing Grace"
+
+    [ ( kind, message, fields ) ] = reporter.events
+    assert kind == "song.create"
+    assert message == "Creating song."
+    assert fields[ "id" ] == 1
+    assert fields[ "name" ] == "Amazing Grace"
+    assert fields[ "duration" ] >= 0.0
+    assert "error" not in fields
+
+  def test_operation_error( self ):
+    reporter = Recorder()
+    with pytest.raises( ConnectionError ):
+      with reporter.operation( "song.create", "Creating song." ):
+        raise ConnectionError( "offline" )
+
+    [ ( kind, message, fields ) ] = reporter.events
+    assert fields[ "error" ] == "offline"
+
+  def test_registry( self ):
+    assert set( reporters ) == { "text", "quiet", "json", "progress" }
+    assert all( issubclass( r, Reporter ) for r in reporters.values() )
+
+
+class TestQuietReporter:
+
+  def test_event( self, capsys ):
+    with QuietReporter() as reporter:
+      reporter.event( "song.keep", "Keeping song." )
+      reporter.stats( run_pipeline() )
+    assert capsys.readouterr().out == ""
+
+
+class TestTextReporter:
+
+  def test_buffered( self ):
+    stream = io.StringIO()
+    reporter = TextReporter( stream )
+    reporter.flush_interval = 60.0
+    reporter.flush()
+
+    reporter.event( "song.keep", "Keeping song.", file="a.sng" )
+    assert stream.getvalue() == ""
+
+    reporter.close()
+    assert stream.getvalue() == "[a.sng] Keeping song.\n"
+
+  def test_buffer_size( self ):
+    stream = io.StringIO()
+    reporter = TextReporter( stream )
+    reporter.flush_interval = 60.0
+    reporter.buffer_size = 2
+    reporter.flush()
+
+    reporter.event( "song.keep", "First." )
+    reporter.event( "song.keep", "Second." )
+    assert stream.getvalue() == "First.\nSecond.\n"
+
+  def test_error( self ):
+    stream = io.StringIO()
+    with TextReporter( stream ) as reporter:
+      reporter.event( "song.create", "Creating song.", error="offline" )
+    assert stream.getvalue() == "Creating song. Failed: offline\n"
+
+  def test_stats( self ):
+    stream = io.StringIO()
+    with TextReporter( stream ) as reporter:
+      reporter.stats( run_pipeline() )
+    assert stream.getvalue().splitlines()[ 1 ].startswith( "only" )
+
+
+class TestJsonReporter:
+
+  def test_event( self ):
+    stream = io.StringIO()
+    with JsonReporter( stream ) as reporter:
+      reporter.event( "song.create", "Creating song.", id=1, duration=0.5 )
+
+    record = json.loads( stream.getvalue() )
+    assert record[ "event" ] == "song.create"
+    assert record[ "message" ] == "Creating song."
+    assert record[ "id" ] == 1
+    assert record[ "duration" ] == 0.5
+    assert "time" in record
+
+  def test_stats( self ):
+    stream = io.StringIO()
+    with JsonReporter( stream ) as reporter:
+      reporter.stats( run_pipeline() )
+
+    [ record ] = [ json.loads( line ) for line in stream.getvalue().splitlines() ]
+    assert record[ "event" ] == "pipeline.stage"
+    assert record[ "stage" ] == "only"
+    assert record[ "processed" ] == 3
+
+
+class TestProgressReporter:
+
+  def test_counts( self ):
+    stream = io.StringIO()
+    with ProgressReporter( stream ) as reporter:
+      reporter.refresh_interval = 60.0
+      reporter.event( "song.keep", "Keeping song." )
+      reporter.event( "song.keep", "Keeping song." )
+      reporter.event( "song.create", "Creating song.", error="offline" )
+      line = reporter.line()
+
+    assert line.endswith( "song.create: 1, song.keep: 2, errors: 1" )
+    assert stream.getvalue().endswith( line + "\n" )
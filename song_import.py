@@ -1,15 +1,27 @@
 #!/usr/bin/env python3
 
+import contextlib
 import datetime
 import requests
 import requests.adapters
 import os
 import enum
+import threading
+import typing
+import sys
 
 import SongBeamer
 import ChurchTools
+import pipeline
+import report
+import watch
 from schema import sanitize
 
+# Peak resident memory of an import --bounded run with the default --cache_limit, interpreter included, stays below this many bytes for any number of files.
+# benchmark_memory.py verifies the ceiling against a synthetic library of 100000 files and an offline ChurchTools stub,
+# whose catalog already holds two thirds of the songs with their arrangements and files.
+memory_ceiling = 64 * 1024 * 1024
+
 ccli_schema = { "maxLength": 50, "type": ( "string",  "null" ) }
 name_schema = { "minLength": 2, "maxLength": 200, "type": "string" }
 copyright_schema = { "maxLength": 400, "type": ( "string",  "null" ) }
@@ -51,19 +63,77 @@ class ChurchToolsSession( ChurchTools.Session ):
   source_id: int | None = None
   arrangement_name: str = "SongBeamer"
   song_category: int = 0
+  prefix_length: int = 6
+  catalog_threshold: int = 100
+  chunk_size: int = 1 << 16
 
-  def __init__( self, api_url: str, *, api_token: str | None, user: str | None ):
+  def __init__(
+    self, api_url: str, *, api_token: str | None, user: str | None, reporter: report.Reporter | None = None, store: ChurchTools.SessionStore | None = None
+  ):
     super().__init__( api_url, api_token )
 
-    if user:
-      self.login( user )
+    self.reporter: report.Reporter = reporter or report.TextReporter()
+    self.user: str | None = user
+    self.store: ChurchTools.SessionStore | None = store
+    self.restored: bool = False
+    self.generation: int = 0
+    self.bootstrap_lock: threading.Lock = threading.Lock()
+    self.local: threading.local = threading.local()
+    self.title_locks: list[ threading.Lock ] = [ threading.Lock() for _ in range( 64 ) ]
+
+    self.cache: ChurchTools.RunCache = ChurchTools.RunCache()
 
     retries = requests.adapters.Retry( total=5, backoff_factor=1, allowed_methods=None, status_forcelist={ 429, } )
     self.mount( self.api_url, requests.adapters.HTTPAdapter( max_retries=retries ) )
 
+    if store and ( state := store.load() ) and state.get( "csrf_token" ):
+      ChurchTools.import_cookies( self.cookies, state.get( "cookies", [] ) )
+      self.headers.update( { "CSRF-Token": state[ "csrf_token" ] } )
+      self.restored = True
+      self.reporter.event( "session.restored", f"Reusing stored session from '{ store.path }'." )
+    else:
+      self.bootstrap()
+
+  def close( self ):
+    try:
+      self.reporter.flush()
+    finally:
+      super().close()
+
+  @contextlib.contextmanager
+  def authenticating( self ) -> typing.Iterator[ None ]:
+    previous = getattr( self.local, "authenticating", False )
+    self.local.authenticating = True
+    try:
+      yield
+    finally:
+      self.local.authenticating = previous
+
+  def bootstrap( self ):
+
+    self.restored = False
+    self.cookies.clear()
+    self.headers.pop( "CSRF-Token", None )
+
+    try:
+      with self.authenticating():
+        self.authenticate()
+    except ConnectionError:
+      if self.store:
+        self.store.clear()
+      raise
+
+    self.generation += 1
+    if self.store:
+      self.store.save( ChurchTools.export_cookies( self.cookies ), self.headers.get( "CSRF-Token" ) )
+
+  def authenticate( self ):
+    if self.user:
+      self.login( self.user )
+
     if result := self.get( self.endpoint_url( "whoami" ) ):
       data = result.json()[ "data" ]
-      print( f"Authenticated as { data[ "firstName" ] } { data[ "lastName" ] } (ID: { data[ "id" ] })." )
+      self.reporter.event( "session.authenticated", f"Authenticated as { data[ "firstName" ] } { data[ "lastName" ] } (ID: { data[ "id" ] }).", user=data[ "id" ] )
     else:
       raise ConnectionError( f"Failed to authenticate: { result.status_code } - { result.text }." )
 
@@ -75,6 +145,63 @@ class ChurchToolsSession( ChurchTools.Session ):
     else:
       raise ConnectionError( f"Failed to obtain CSRF token: { result.status_code } - { result.text }" )
 
+  def relogin( self, generation: int ) -> bool:
+    with self.bootstrap_lock, self.authenticating():
+      if self.generation != generation:
+        return True
+
+      if self.get( self.endpoint_url( "whoami" ) ):
+        return False
+
+      if self.restored:
+        self.reporter.event( "session.expired", "Stored session was rejected, logging in again." )
+      else:
+        self.reporter.event( "session.expired", "Session expired, logging in again." )
+      self.bootstrap()
+      return True
+
+  def send( self, request: requests.PreparedRequest, **kwargs ) -> requests.Response:
+    generation = self.generation
+    response = super().send( request, **kwargs )
+
+    # Listings send prepared requests directly, so re-authentication has to happen here rather than in request().
+    # A rejection is only retried once the session itself turned out to be invalid, not for a plain lack of permission.
+    if response.status_code in ( 401, 403 ) and ( self.user or self.store ) and not getattr( self.local, "authenticating", False ):
+      if self.relogin( generation ):
+        response.close()
+        retry = request.copy()
+        retry.headers.pop( "Cookie", None )
+        retry.prepare_cookies( self.cookies )
+        if token := self.headers.get( "CSRF-Token" ):
+          retry.headers[ "CSRF-Token" ] = token
+        response = super().send( retry, **kwargs )
+
+    return response
+
+  def resolve_titles( self, titles: typing.Iterable[ str ] ):
+
+    pending: dict[ str, str ] = {}
+    for title in titles:
+      if title and self.cache.search( title ) is None:
+        pending.setdefault( ChurchTools.search_key( title ), title )
+
+    if not pending:
+      return
+
+    with self.cache.resolving():
+      if len( pending ) >= self.catalog_threshold:
+        self.cache.store_catalog( self.collect( requests.Request( "GET", self.api_url + "/songs" ) ) )
+      else:
+        for query, group in ChurchTools.plan_searches( pending.values(), prefix_length=self.prefix_length ).items():
+          songs = self.collect( requests.Request( "GET", self.api_url + "/songs", params={ "name": query } ) )
+          for title in group:
+            self.cache.store_search( title, ( s for s in songs if ChurchTools.name_matches( title, s.get( "name", "" ) ) ) )
+
+  def search_songs( self, title: str ) -> list[ dict ]:
+    while ( songs := self.cache.search( title ) ) is None:
+      self.resolve_titles( [ title ] )
+    return songs
+
   def match_arrangement( self, song: SongBeamer.ImportedSong, arrangements: list[ dict ] ) -> dict | None:
     for arrangement in arrangements:
       if self.source_id is None or arrangement.get( "sourceId" ) == self.source_id:
@@ -108,12 +235,22 @@ class ChurchToolsSession( ChurchTools.Session ):
     else:
       return None
 
+  def title_lock( self, title: str ) -> threading.Lock:
+    return self.title_locks[ hash( ChurchTools.search_key( title ) ) % len( self.title_locks ) ]
+
   def import_song( self, song: SongBeamer.ImportedSong ) -> dict | None:
+    # Songs with the same title are matched one after the other, so a song created for the first is found by the next.
+    with self.title_lock( song.title or "" ):
+      return self.match_or_create_song( song )
 
-    songs = self.collect( requests.Request( "GET", self.api_url + "/songs", params={ "name": song.title } ) )
+  def match_or_create_song( self, song: SongBeamer.ImportedSong ) -> dict | None:
+
+    file_name = os.path.basename( song.file_name )
+
+    songs = self.search_songs( song.title )
     for s in songs:
-      if "arrangements" not in s:
-        s[ "arrangements" ] = self.collect( requests.Request( "GET", f"{ self.api_url }/songs/{ s[ "id" ] }/arrangements" ) )
+      if self.cache.arrangements( s ) is None:
+        self.cache.store_arrangements( s, self.collect( requests.Request( "GET", f"{ self.api_url }/songs/{ s[ "id" ] }/arrangements" ) ) )
 
     match self.match_song( song, songs ):
       case dict() as existing:
@@ -138,19 +275,17 @@ class ChurchToolsSession( ChurchTools.Session ):
           needs_update = True
 
         if needs_update:
-          print( f"Updating existing song: { existing[ "id" ] } - { existing[ "name" ] }" )
-          if result := self.put( f"{ self.api_url }/songs/{ existing[ "id" ] }", json=update ):
-            pass
-          else:
-            raise ConnectionError( f"Failed to update song { existing[ "id" ] }: { result.status_code } - { result.text }" )
+          with self.reporter.operation( "song.update", f"Updating existing song: { existing[ "id" ] } - { existing[ "name" ] }", file=file_name, song=existing[ "id" ] ):
+            if result := self.put( f"{ self.api_url }/songs/{ existing[ "id" ] }", json=update ):
+              existing.update( { k: v for k, v in update.items() if k in [ "author", "ccli", "copyright" ] } )
+            else:
+              raise ConnectionError( f"Failed to update song { existing[ "id" ] }: { result.status_code } - { result.text }" )
         else:
-          print( f"Keep existing song: { existing[ "id" ] } - { existing[ "name" ] }" )
+          self.reporter.event( "song.keep", f"Keep existing song: { existing[ "id" ] } - { existing[ "name" ] }", file=file_name, song=existing[ "id" ] )
 
         return existing
 
       case None:
-        print( f"Creating new song: { song.title }" )
-
         insert: dict = { "name": song.title, "categoryId": self.song_category }
 
         if song.ccli:
@@ -162,15 +297,19 @@ class ChurchToolsSession( ChurchTools.Session ):
         if song.copyright:
           insert[ "copyright" ] = song.copyright
 
-        if result := self.post( self.api_url + "/songs", json=insert ):
-          return result.json()[ "data" ]
-        else:
-          raise ConnectionError( f"Faile to create song: { result.status_code } - { result.text }" )
+        with self.reporter.operation( "song.create", f"Creating new song: { song.title }", file=file_name ) as fields:
+          if result := self.post( self.api_url + "/songs", json=insert ):
+            created = self.cache.add_song( result.json()[ "data" ] )
+            fields[ "song" ] = created[ "id" ]
+            return created
+          else:
+            raise ConnectionError( f"Faile to create song: { result.status_code } - { result.text }" )
 
       case Ambiguous():
-        print( f"Could not match song '{ song.title }'." )
+        self.reporter.event( "song.ambiguous", f"Could not match song '{ song.title }'.", file=file_name )
 
   def import_arrangement( self, song: SongBeamer.ImportedSong, ct_song: dict ) -> dict:
+    file_name = os.path.basename( song.file_name )
     match self.match_arrangement( song, ct_song.get( "arrangements", [] ) ):
       case dict() as existing:
 
@@ -188,19 +327,19 @@ class ChurchToolsSession( ChurchTools.Session ):
           needs_update = True
 
         if needs_update:
-          print( f"Updating existing arrangement { existing[ "id" ] } for song id { ct_song[ "id" ] }." )
-          if result := self.put( f"{ self.api_url }/songs/{ ct_song[ "id" ] }/arrangements/{ existing[ "id" ] }", json=update ):
-            pass
-          else:
-            raise ConnectionError( f"Failed to update arrangement { existing[ "id" ] } of song { ct_song[ "id" ] }: { result.status_code } - { result.text }" )
+          message = f"Updating existing arrangement { existing[ "id" ] } for song id { ct_song[ "id" ] }."
+          with self.reporter.operation( "arrangement.update", message, file=file_name, song=ct_song[ "id" ], arrangement=existing[ "id" ] ):
+            if result := self.put( f"{ self.api_url }/songs/{ ct_song[ "id" ] }/arrangements/{ existing[ "id" ] }", json=update ):
+              existing.update( update )
+            else:
+              raise ConnectionError( f"Failed to update arrangement { existing[ "id" ] } of song { ct_song[ "id" ] }: { result.status_code } - { result.text }" )
         else:
-          print( f"Keeping existing arrangement { existing[ "id" ] } for song id { ct_song[ "id" ] }." )
+          message = f"Keeping existing arrangement { existing[ "id" ] } for song id { ct_song[ "id" ] }."
+          self.reporter.event( "arrangement.keep", message, file=file_name, song=ct_song[ "id" ], arrangement=existing[ "id" ] )
 
         return existing
 
       case None:
-        print( f"Creating new arrangement for song id { ct_song[ "id" ] }." )
-
         insert: dict = {
           "name": self.arrangement_name,
           "description": f"Created from '{ os.path.basename( song.file_name ) }' on { datetime.date.today().isoformat() }"
@@ -212,36 +351,125 @@ class ChurchToolsSession( ChurchTools.Session ):
         if song.key:
           insert[ "key" ] = song.key
 
-        if result := self.post( f"{ self.api_url }/songs/{ ct_song[ "id" ] }/arrangements", json=insert ):
-          return result.json()[ "data" ]
-        else:
-          raise ConnectionError( f"Failed to create arrangement: { result.status_code } - { result.text }." )
+        with self.reporter.operation( "arrangement.create", f"Creating new arrangement for song id { ct_song[ "id" ] }.", file=file_name, song=ct_song[ "id" ] ) as fields:
+          if result := self.post( f"{ self.api_url }/songs/{ ct_song[ "id" ] }/arrangements", json=insert ):
+            created = result.json()[ "data" ]
+            self.cache.add_arrangement( ct_song, created )
+            fields[ "arrangement" ] = created[ "id" ]
+            return created
+          else:
+            raise ConnectionError( f"Failed to create arrangement: { result.status_code } - { result.text }." )
 
   def import_attachment( self, song: SongBeamer.ImportedSong, arrangement: dict, mode: AttachmentMode = AttachmentMode.SKIP ):
+    file_name = os.path.basename( song.file_name )
+
     if mode != AttachmentMode.ADD:
 
-      arrangement[ "files" ] = self.collect( requests.Request( "GET", f"{ self.api_url }/files/song_arrangement/{ arrangement[ "id" ] }" ) )
+      files = self.cache.attachments( arrangement )
+      if files is None:
+        files = self.cache.store_attachments( arrangement, self.collect( requests.Request( "GET", f"{ self.api_url }/files/song_arrangement/{ arrangement[ "id" ] }" ) ) )
 
-      for file in arrangement.get( "files", [] ):
-        if file.get( "name" ) == os.path.basename( song.file_name ):
+      for file in files:
+        if file.get( "name" ) == file_name:
           if mode == AttachmentMode.SKIP:
-            print( f"Keeping existing attachment { file[ "id" ] } for arrangement { arrangement[ "id" ] }." )
+            message = f"Keeping existing attachment { file[ "id" ] } for arrangement { arrangement[ "id" ] }."
+            self.reporter.event( "attachment.keep", message, file=file_name, arrangement=arrangement[ "id" ], attachment=file[ "id" ] )
             return
           elif mode == AttachmentMode.REPLACE:
-            print( f"Deleting existing attachment { file[ "id" ] } for arrangement { arrangement[ "id" ] }." )
-            if result := self.delete( f"{ self.api_url }/files/{ file[ "id" ] }" ):
-              pass
-            else:
-              raise ConnectionError( f"Failed to delete attachment { file[ "id" ] }: { result.status_code } - { result.text }" )
-
-    print( f"Uploading attachment '{ os.path.basename( song.file_name ) }' for arrangement { arrangement[ "id" ] }." )
-    with open( song.file_name, "rb" ) as file:
-      files = { "files[]": ( os.path.basename( song.file_name ), file ) }
+            message = f"Deleting existing attachment { file[ "id" ] } for arrangement { arrangement[ "id" ] }."
+            with self.reporter.operation( "attachment.delete", message, file=file_name, arrangement=arrangement[ "id" ], attachment=file[ "id" ] ):
+              if result := self.delete( f"{ self.api_url }/files/{ file[ "id" ] }" ):
+                self.cache.forget_attachment( arrangement, file[ "id" ] )
+              else:
+                raise ConnectionError( f"Failed to delete attachment { file[ "id" ] }: { result.status_code } - { result.text }" )
+
+    message = f"Uploading attachment '{ file_name }' for arrangement { arrangement[ "id" ] }."
+    with self.reporter.operation( "attachment.upload", message, file=file_name, arrangement=arrangement[ "id" ] ), open( song.file_name, "rb" ) as file:
+      files = { "files[]": ( file_name, file ) }
       if result := self.post( f"{ self.api_url }/files/song_arrangement/{ arrangement[ "id" ] }", files=files ):
+        try:
+          data = result.json().get( "data" )
+        except ValueError:
+          data = None
+        match data:
+          case list() as uploaded:
+            pass
+          case dict() as uploaded:
+            uploaded = [ uploaded ]
+          case _:
+            uploaded = [ { "name": file_name } ]
+        for file in uploaded:
+          self.cache.add_attachment( arrangement, file )
         return
       else:
         raise ConnectionError( f"Failed to upload attachment for arrangement { arrangement[ "id" ] }: { result.status_code } - { result.text }" )
 
+  def list_attachments( self, song: dict ) -> typing.Iterator[ tuple[ dict, dict ] ]:
+    arrangements = song.get( "arrangements" )
+    if arrangements is None:
+      arrangements = self.iterate( requests.Request( "GET", f"{ self.api_url }/songs/{ song[ "id" ] }/arrangements" ) )
+
+    for arrangement in arrangements:
+      files = arrangement.get( "files" )
+      if files is None:
+        files = self.iterate( requests.Request( "GET", f"{ self.api_url }/files/song_arrangement/{ arrangement[ "id" ] }" ) )
+
+      for file in files:
+        yield arrangement, file
+
+  def download_attachment( self, file: dict, path: str ) -> bool:
+    local_size = os.path.getsize( path ) if os.path.isfile( path ) else None
+
+    if local_size is not None and local_size == file.get( "size" ):
+      self.reporter.event( "attachment.keep", f"Keeping exported attachment '{ path }'.", file=os.path.basename( path ), attachment=file.get( "id" ) )
+      return False
+
+    if not ( url := file.get( "fileUrl" ) ):
+      self.reporter.event( "attachment.skip", f"Skipping attachment { file.get( "id" ) } without download URL.", file=os.path.basename( path ), attachment=file.get( "id" ) )
+      return False
+
+    message = f"Downloading attachment { file.get( "id" ) } to '{ path }'."
+    try:
+      result = self.get( url, stream=True )
+      if not result:
+        result.close()
+        raise ConnectionError( f"Failed to download attachment { file.get( "id" ) }: { result.status_code } - { result.text }" )
+    except Exception as error:
+      self.reporter.event( "attachment.download", message, file=os.path.basename( path ), attachment=file.get( "id" ), error=str( error ) )
+      raise
+
+    with result:
+      if local_size is not None and result.headers.get( "Content-Length" ) == str( local_size ):
+        self.reporter.event( "attachment.keep", f"Keeping exported attachment '{ path }'.", file=os.path.basename( path ), attachment=file.get( "id" ) )
+        return False
+
+      with self.reporter.operation( "attachment.download", message, file=os.path.basename( path ), attachment=file.get( "id" ) ) as fields:
+        partial = path + ".part"
+        try:
+          with open( partial, "wb" ) as target:
+            for chunk in result.iter_content( self.chunk_size ):
+              target.write( chunk )
+            fields[ "size" ] = target.tell()
+          os.replace( partial, path )
+        except BaseException:
+          if os.path.exists( partial ):
+            os.remove( partial )
+          raise
+
+    return True
+
+  def export_files( self, song: dict, directory: str, claimed: dict[ str, int ], *, all_attachments: bool = False ) -> typing.Iterator[ tuple[ dict, str ] ]:
+    for _, file in self.list_attachments( song ):
+      name = os.path.basename( file.get( "name", "" ).replace( "\\", "/" ) )
+      if name in ( "", ".", ".." ):
+        continue
+      if not all_attachments and not name.endswith( ".sng" ):
+        continue
+      if claimed.setdefault( name, file[ "id" ] ) != file[ "id" ]:
+        stem, extension = os.path.splitext( name )
+        name = f"{ stem } ({ file[ "id" ] }){ extension }"
+      yield file, os.path.join( directory, name )
+
   def set_default_arrangement( self, song_id: int, arrangement_id: int ):
     if result := self.patch( f"{ self.api_url }/songs/{ song_id }/arrangements/{ arrangement_id }/default" ):
       return
@@ -258,20 +486,48 @@ class ChurchToolsSession( ChurchTools.Session ):
 
       for arrangement in self.collect( requests.Request( "GET", f"{ self.api_url }/songs/{ song[ "id" ] }/arrangements" ) ):
         if arrangement.get( "sourceId" ) == self.source_id:
-          print( f"Deleting arrangement { arrangement[ "id" ] } of song { song[ "id" ] }." )
-          if result := self.delete( f"{ self.api_url }/songs/{ song[ "id" ] }/arrangements/{ arrangement[ "id" ] }" ):
-            pass
-          else:
-            raise ConnectionError( f"Failed to delete arrangement { arrangement[ "id" ] } of song { song[ "id" ] }: { result.status_code } - { result.text }" )
+          message = f"Deleting arrangement { arrangement[ "id" ] } of song { song[ "id" ] }."
+          with self.reporter.operation( "arrangement.delete", message, song=song[ "id" ], arrangement=arrangement[ "id" ] ):
+            if result := self.delete( f"{ self.api_url }/songs/{ song[ "id" ] }/arrangements/{ arrangement[ "id" ] }" ):
+              self.cache.forget_arrangement( song[ "id" ], arrangement[ "id" ] )
+            else:
+              raise ConnectionError( f"Failed to delete arrangement { arrangement[ "id" ] } of song { song[ "id" ] }: { result.status_code } - { result.text }" )
         else:
           delete_song = False
 
       if delete_song:
-        print( f"Deleting song { song[ "id" ] } - { song[ "name" ] }." )
-        if result := self.delete( f"{ self.api_url }/songs/{ song[ "id" ] }" ):
-          pass
-        else:
-          raise ConnectionError( f"Failed to delete song { song[ "id" ] }: { result.status_code } - { result.text }" )
+        with self.reporter.operation( "song.delete", f"Deleting song { song[ "id" ] } - { song[ "name" ] }.", song=song[ "id" ] ):
+          if result := self.delete( f"{ self.api_url }/songs/{ song[ "id" ] }" ):
+            self.cache.forget_song( song[ "id" ] )
+          else:
+            raise ConnectionError( f"Failed to delete song { song[ "id" ] }: { result.status_code } - { result.text }" )
+
+
+def source_paths( item ) -> list[ str ]:
+  match item:
+    case str():
+      return [ item ]
+    case SongBeamer.ImportedSong():
+      return [ item.file_name ]
+    case list():
+      return [ path for i in item for path in source_paths( i ) ]
+    case ( SongBeamer.ImportedSong() as song, *_ ):
+      return [ song.file_name ]
+    case _:
+      return []
+
+
+# While watching, a failing file must not cancel the rest of its batch.
+# The wrapped stage reports and records the files it failed on instead, so they can be retried with the next change.
+def isolate( function: typing.Callable, failed: set[ str ], reporter: report.Reporter ) -> typing.Callable:
+  def run( item ):
+    try:
+      yield from function( item ) or ()
+    except Exception as error:
+      for path in source_paths( item ):
+        failed.add( os.path.abspath( path ) )
+        reporter.event( "watch.error", "Failed to synchronise file, retrying with the next change.", file=os.path.basename( path ), error=str( error ) )
+  return run
 
 
 if __name__ == "__main__":
@@ -294,6 +550,8 @@ if __name__ == "__main__":
   auth_group = parser.add_mutually_exclusive_group( required=( "api_token" not in defaults and "user" not in defaults ) )
   auth_group.add_argument( "-t", "--api-token", type=str, help="ChurchTools API token", metavar="TOKEN" )
   auth_group.add_argument( "--user", type=str, help="ChurchTools User Name", metavar="USER" )
+  parser.add_argument( "--remember_session", action="store_true", help="Store session cookies and CSRF token for later runs" )
+  parser.add_argument( "--output", type=str, choices=list( report.reporters ), default="text", help="Format of progress output" )
   parser.set_defaults( **defaults )
 
   sub_parsers = parser.add_subparsers( dest="command" )
@@ -301,6 +559,18 @@ if __name__ == "__main__":
   import_parser = sub_parsers.add_parser( "import", help="Import .sng files into ChurchTools." )
   import_parser.add_argument( "--source_id", type=int, help="Source ID for imported arrangements", metavar="ID" )
   import_parser.add_argument( "--attachment_mode", type=AttachmentMode, choices=list( AttachmentMode ), default="skip" )
+  import_parser.add_argument( "--parse_workers", type=int, help="Number of threads reading .sng files", default=2, metavar="N" )
+  import_parser.add_argument( "--match_workers", type=int, help="Number of threads matching songs in ChurchTools", default=1, metavar="N" )
+  import_parser.add_argument( "--upload_workers", type=int, help="Number of threads uploading attachments", default=4, metavar="N" )
+  import_parser.add_argument( "--batch_size", type=int, help="Number of song titles resolved together", default=100, metavar="N" )
+  import_parser.add_argument( "--catalog_threshold", type=int, help="Number of titles above which the whole catalog is listed at once", default=100, metavar="N" )
+  import_parser.add_argument( "--queue_size", type=int, help="Maximum number of items waiting between two stages", default=16, metavar="N" )
+  import_parser.add_argument( "--report_interval", type=float, help="Seconds between progress reports (0 to disable)", default=0.0, metavar="SECONDS" )
+  import_parser.add_argument( "--bounded", action="store_true", help="Never list the whole catalog and limit the number of cached songs, for very large libraries" )
+  import_parser.add_argument( "--cache_limit", type=int, help="Number of cached songs after which --bounded clears the cache", default=10000, metavar="N" )
+  import_parser.add_argument( "--watch", action="store_true", help="Keep running and import .sng files as they are created or modified" )
+  import_parser.add_argument( "--debounce", type=float, help="Seconds without changes before a burst of changes is imported", default=1.0, metavar="SECONDS" )
+  import_parser.add_argument( "--poll_interval", type=float, help="Seconds between directory scans where inotify is unavailable", default=2.0, metavar="SECONDS" )
   import_parser.add_argument( "source", type=str, default=".", nargs="+" )
   import_parser.set_defaults( **defaults )
 
@@ -308,41 +578,156 @@ if __name__ == "__main__":
   delete_parser.add_argument( "--source_id", type=int, help="Source ID of imported arrangements.", required=( "source_id" not in defaults ), metavar="ID" )
   delete_parser.set_defaults( **defaults )
 
+  export_parser = sub_parsers.add_parser( "export", help="Export attachments of all songs from ChurchTools." )
+  export_parser.add_argument( "--download_workers", type=int, help="Number of threads downloading attachments", default=4, metavar="N" )
+  export_parser.add_argument( "--queue_size", type=int, help="Maximum number of items waiting between two stages", default=16, metavar="N" )
+  export_parser.add_argument( "--report_interval", type=float, help="Seconds between progress reports (0 to disable)", default=0.0, metavar="SECONDS" )
+  export_parser.add_argument( "--all_attachments", action="store_true", help="Export all attachments instead of .sng files only" )
+  export_parser.add_argument( "directory", type=str, help="Directory to write the exported files to" )
+  export_parser.set_defaults( **defaults )
+
   test_parser = sub_parsers.add_parser( "test", help="Test the ChurchTools connection." )
 
   arguments = parser.parse_args()
 
-  match arguments.command:
+  store = ChurchTools.SessionStore( arguments.api_url, arguments.user ) if arguments.remember_session else None
+
+  with report.reporters[ arguments.output ]() as reporter:
+    match arguments.command:
+
+      case "import":
+        with ChurchToolsSession( arguments.api_url, api_token=arguments.api_token, user=arguments.user, reporter=reporter, store=store ) as session:
+
+          session.source_id = arguments.source_id
+          session.catalog_threshold = arguments.catalog_threshold
 
-    case "import":
-      with ChurchToolsSession( arguments.api_url, api_token=arguments.api_token, user=arguments.user ) as session:
+          if arguments.bounded:
+            session.catalog_threshold = sys.maxsize
+            session.cache = ChurchTools.RunCache( limit=arguments.cache_limit )
 
-        session.source_id = arguments.source_id
+          def scan( source ):
+            if os.path.isdir( source ):
+              for file in os.scandir( source ):
+                if file.is_file() and file.name.endswith( ".sng" ):
+                  yield file.path
+            else:
+              yield source
+
+          def parse( path ):
+            if song := SongBeamer.read_song( path ):
+              yield song
+
+          def resolve( songs ):
+            session.resolve_titles( song.title for song in songs )
+            return songs
 
-        def do_import( path ):
-          if song := SongBeamer.read_song( path ):
+          def match( song ):
             if ct_song := session.import_song( song ):
-              if ct_arrangement := session.import_arrangement( song, ct_song ):
-                session.import_attachment( song, ct_arrangement, mode=arguments.attachment_mode )
-                session.set_default_arrangement( ct_song[ "id" ], ct_arrangement[ "id" ] )
-
-        for source in arguments.source:
-          if os.path.isdir( source ):
-            for file in os.scandir( source ):
-              if file.is_file() and file.name.endswith( ".sng" ):
-                do_import( file.path )
+              yield song, ct_song
+
+          def write( item ):
+            # Writing stays on one worker, so the default arrangement is the one of the last file written for a song.
+            song, ct_song = item
+            if ct_arrangement := session.import_arrangement( song, ct_song ):
+              session.set_default_arrangement( ct_song[ "id" ], ct_arrangement[ "id" ] )
+              yield song, ct_song, ct_arrangement
+
+          def upload( item ):
+            song, ct_song, ct_arrangement = item
+            session.import_attachment( song, ct_arrangement, mode=arguments.attachment_mode )
+
+          def build_pipeline( wrap=lambda function: function ):
+            return pipeline.Pipeline(
+              pipeline.Stage( "scan", wrap( scan ), capacity=arguments.queue_size ),
+              pipeline.Stage( "parse", wrap( parse ), workers=arguments.parse_workers, capacity=arguments.queue_size ),
+              pipeline.Stage( "resolve", wrap( resolve ), batch_size=arguments.batch_size, capacity=arguments.queue_size ),
+              pipeline.Stage( "match", wrap( match ), workers=arguments.match_workers, capacity=arguments.queue_size ),
+              pipeline.Stage( "write", wrap( write ), capacity=arguments.queue_size ),
+              pipeline.Stage( "upload", wrap( upload ), workers=arguments.upload_workers, capacity=arguments.queue_size ),
+            )
+
+          import_pipeline = build_pipeline()
+
+          def sync( sources ):
+            try:
+              import_pipeline.run( sources, report=session.reporter.stats if arguments.report_interval else None, report_interval=arguments.report_interval or 0.0 )
+            finally:
+              session.reporter.stats( import_pipeline )
+
+          if not arguments.watch:
+            sync( arguments.source )
+
           else:
-            do_import( source )
-
-    case "delete":
-      with ChurchToolsSession( arguments.api_url, api_token=arguments.api_token, user=arguments.user ) as session:
-        session.source_id = arguments.source_id
-        session.delete_imported_songs()
-
-    case "test":
-      with ChurchToolsSession( arguments.api_url, api_token=arguments.api_token, user=arguments.user ) as session:
-        if result := session.get( f"{ session.api_url }/info" ):
-          info = result.json()
-          print( f"Connected to ChurchTools { info[ "version" ] } of '{ info[ "siteName" ] }'." )
-        else:
-          raise ConnectionError( f"Failed to get ChurchTools info: { result.status_code } - { result.text }" )
+            directories = { os.path.abspath( source ) for source in arguments.source if os.path.isdir( source ) }
+            files = { os.path.abspath( source ) for source in arguments.source if not os.path.isdir( source ) }
+
+            with watch.create_watcher( directories | { os.path.dirname( f ) for f in files }, suffix=".sng", interval=arguments.poll_interval ) as watcher:
+              session.reporter.event( "watch.start", f"Watching { len( watcher.directories ) } directories using { type( watcher ).__name__ }.", watcher=type( watcher ).__name__ )
+
+              failed: set[ str ] = set()
+              watch_pipeline = build_pipeline( lambda function: isolate( function, failed, session.reporter ) )
+
+              def sync_watched( paths: list[ str ] ) -> set[ str ]:
+                session.cache = ChurchTools.RunCache( limit=session.cache.limit )
+                failed.clear()
+                try:
+                  with session.reporter.operation( "watch.sync", f"Synchronising { len( paths ) } paths.", files=len( paths ) ):
+                    watch_pipeline.run( paths, report=session.reporter.stats if arguments.report_interval else None, report_interval=arguments.report_interval or 0.0 )
+                finally:
+                  session.reporter.flush()
+                return set( failed )
+
+              def selected( path: str ) -> bool:
+                return os.path.dirname( path ) in directories or path in files
+
+              try:
+                for _ in watch.synchronise( watcher, sync_watched, arguments.source, select=selected, delay=arguments.debounce ):
+                  pass
+              except KeyboardInterrupt:
+                session.reporter.event( "watch.stop", "Stopped watching." )
+
+      case "delete":
+        with ChurchToolsSession( arguments.api_url, api_token=arguments.api_token, user=arguments.user, reporter=reporter, store=store ) as session:
+          session.source_id = arguments.source_id
+          session.delete_imported_songs()
+
+      case "export":
+        with ChurchToolsSession( arguments.api_url, api_token=arguments.api_token, user=arguments.user, reporter=reporter, store=store ) as session:
+
+          os.makedirs( arguments.directory, exist_ok=True )
+          claimed: dict[ str, int ] = {}
+
+          failed: list[ str ] = []
+
+          def list_files( ct_song ):
+            return session.export_files( ct_song, arguments.directory, claimed, all_attachments=arguments.all_attachments )
+
+          def download( item ):
+            # download_attachment reports its own failures; one missing file must not end a full export.
+            try:
+              session.download_attachment( *item )
+            except Exception:
+              failed.append( item[ 1 ] )
+
+          export_pipeline = pipeline.Pipeline(
+            pipeline.Stage( "list", list_files, capacity=arguments.queue_size ),
+            pipeline.Stage( "download", download, workers=arguments.download_workers, capacity=arguments.queue_size ),
+          )
+
+          try:
+            songs = session.iterate( requests.Request( "GET", session.api_url + "/songs" ) )
+            export_pipeline.run( songs, report=session.reporter.stats if arguments.report_interval else None, report_interval=arguments.report_interval or 0.0 )
+          finally:
+            session.reporter.stats( export_pipeline )
+
+          if failed:
+            session.reporter.event( "export.failed", f"Failed to download { len( failed ) } attachments.", failed=len( failed ) )
+            sys.exit( 1 )
+
+      case "test":
+        with ChurchToolsSession( arguments.api_url, api_token=arguments.api_token, user=arguments.user, reporter=reporter, store=store ) as session:
+          if result := session.get( f"{ session.api_url }/info" ):
+            info = result.json()
+            session.reporter.event( "session.info", f"Connected to ChurchTools { info[ "version" ] } of '{ info[ "siteName" ] }'.", version=info[ "version" ] )
+          else:
+            raise ConnectionError( f"Failed to get ChurchTools info: { result.status_code } - { result.text }" )
@@ -0,0 +1,283 @@
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+import pytest
+import requests
+import requests.adapters
+
+import ChurchTools
+import SongBeamer
+import pipeline
+import report
+
+if sys.version_info < ( 3, 12 ):
+  pytest.skip( "song_import.py uses Python 3.12 f-string syntax", allow_module_level=True )
+
+from song_import import ChurchToolsSession, isolate, source_paths  # noqa: E402
+
+
+class FakeServer( requests.adapters.BaseAdapter ):
+
+  def __init__( self, session: requests.Session, *, password: str = "secret" ) -> None:
+    super().__init__()
+    self.session: requests.Session = session
+    self.password: str = password
+    self.cookie: str = "fresh"
+    self.token: str = "token"
+    self.logins: int = 0
+    self.sent: list[ requests.PreparedRequest ] = []
+    self.songs: list[ dict ] = [ { "id": 1, "name": "Amazing Grace", "category": { "id": 0 }, "arrangements": [] } ]
+    self.files: dict[ str, bytes ] = {}
+    self.create_delay: float = 0.0
+
+  def respond( self, request: requests.PreparedRequest, status: int, data ) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.request = request
+    response.url = request.url
+    response._content = data if isinstance( data, bytes ) else json.dumps( { "data": data } ).encode()
+    response._content_consumed = True
+    response.headers[ "Content-Length" ] = str( len( response._content ) )
+    return response
+
+  def send( self, request: requests.PreparedRequest, **kwargs ) -> requests.Response:
+    self.sent.append( request )
+    endpoint = urllib.parse.urlsplit( request.url ).path.removeprefix( "/api/" )
+
+    if endpoint == "login":
+      if urllib.parse.parse_qs( request.body ).get( "password" ) != [ self.password ]:
+        return self.respond( request, 401, None )
+      self.logins += 1
+      self.session.cookies.set( "session", self.cookie, domain="church.tools.local", path="/" )
+      return self.respond( request, 200, None )
+
+    if f"session={ self.cookie }" not in request.headers.get( "Cookie", "" ):
+      return self.respond( request, 401, None )
+
+    query = urllib.parse.parse_qs( urllib.parse.urlsplit( request.url ).query )
+
+    match endpoint:
+      case "whoami":
+        return self.respond( request, 200, { "id": 1, "firstName": "Test", "lastName": "User" } )
+      case "csrftoken":
+        return self.respond( request, 200, self.token )
+      case "songs" if request.method == "GET":
+        name = query.get( "name", [ "" ] )[ 0 ].casefold()
+        return self.respond( request, 200, [ s for s in self.songs if name in s[ "name" ].casefold() ] )
+      case "songs" if request.headers.get( "CSRF-Token" ) == self.token:
+        time.sleep( self.create_delay )
+        song = { "id": len( self.songs ) + 1, "name": json.loads( request.body ).get( "name", "" ), "category": { "id": 0 }, "arrangements": [] }
+        self.songs.append( song )
+        return self.respond( request, 200, song )
+      case _ if request.method == "GET" and endpoint.endswith( "/arrangements" ):
+        return self.respond( request, 200, [] )
+      case _ if endpoint.startswith( "/download/" ):
+        name = endpoint.removeprefix( "/download/" )
+        return self.respond( request, 200, self.files[ name ] ) if name in self.files else self.respond( request, 404, None )
+      case _:
+        return self.respond( request, 403, None )
+
+  def close( self ):
+    pass
+
+
+url = "https://church.tools.local/api"
+
+
+@pytest.fixture
+def store( tmp_path ):
+  store = ChurchTools.SessionStore( url, "user", directory=str( tmp_path ) )
+  store.save( [ { "name": "session", "value": "stale", "domain": "church.tools.local", "path": "/" } ], "outdated" )
+  return store
+
+
+@pytest.fixture
+def session( store, monkeypatch ):
+  monkeypatch.setattr( "getpass.getpass", lambda prompt: "secret" )
+  session = ChurchToolsSession( url, api_token=None, user="user", reporter=report.QuietReporter(), store=store )
+  server = FakeServer( session )
+  session.mount( url, server )
+  session.mount( "https://church.tools.local/", server )
+  yield session, server
+  session.close()
+
+
+class TestChurchToolsSession:
+
+  def test_restored( self, session ):
+    session, server = session
+    assert session.restored
+    assert not server.sent
+
+  def test_stale_listing( self, session, store ):
+    session, server = session
+
+    assert [ song[ "id" ] for song in session.search_songs( "Amazing Grace" ) ] == [ 1 ]
+    assert server.logins == 1
+
+    state = store.load()
+    assert state[ "csrf_token" ] == server.token
+    assert [ cookie[ "value" ] for cookie in state[ "cookies" ] ] == [ server.cookie ]
+
+  def test_stale_write( self, session ):
+    session, server = session
+
+    assert session.post( session.endpoint_url( "songs" ), json={ "name": "New Song" } ).json()[ "data" ][ "id" ] == 2
+    assert server.sent[ -1 ].headers[ "CSRF-Token" ] == server.token
+
+  def test_expires_later( self, session, store ):
+    session, server = session
+    session.search_songs( "Amazing Grace" )
+
+    server.cookie = "renewed"
+    server.token = "renewed"
+    session.cache = ChurchTools.RunCache()
+
+    assert session.search_songs( "Amazing Grace" )
+    assert server.logins == 2
+    assert store.load()[ "csrf_token" ] == "renewed"
+
+  def test_forbidden( self, session ):
+    session, server = session
+    session.search_songs( "Amazing Grace" )
+
+    assert session.delete( session.endpoint_url( "songs/1" ) ).status_code == 403
+    assert server.logins == 1
+
+  def test_failed_login( self, session, store ):
+    session, server = session
+    server.password = "changed"
+
+    with pytest.raises( ConnectionError ):
+      session.search_songs( "Amazing Grace" )
+    assert store.load() is None
+
+  def test_same_title_concurrently( self, session ):
+    session, server = session
+    server.create_delay = 0.2
+
+    songs = [ SongBeamer.ImportedSong( "How Great Thou Art", f"{ i }.sng" ) for i in range( 3 ) ]
+    created: list[ dict ] = []
+    threads = [ threading.Thread( target=lambda song=song: created.append( session.import_song( song ) ) ) for song in songs ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    assert len( [ r for r in server.sent if r.method == "POST" and r.url.endswith( "/songs" ) ] ) == 1
+    assert len( created ) == 3
+    assert len( { song[ "id" ] for song in created } ) == 1
+
+
+class TestExport:
+
+  def attachment( self, server, name: str, content: bytes, **fields ) -> dict:
+    server.files[ name ] = content
+    return { "id": 10, "name": name, "fileUrl": f"https://church.tools.local/download/{ name }", **fields }
+
+  def test_download( self, session, tmp_path ):
+    session, server = session
+    path = tmp_path / "song.sng"
+
+    assert session.download_attachment( self.attachment( server, "song.sng", b"#Title=Song\n" ), str( path ) )
+    assert path.read_bytes() == b"#Title=Song\n"
+    assert not ( tmp_path / "song.sng.part" ).exists()
+
+  def test_keep_by_size( self, session, tmp_path ):
+    session, server = session
+    path = tmp_path / "song.sng"
+    path.write_bytes( b"local" )
+
+    assert not session.download_attachment( self.attachment( server, "song.sng", b"other", size=5 ), str( path ) )
+    assert path.read_bytes() == b"local"
+    assert not server.sent
+
+  def test_keep_by_content_length( self, session, tmp_path ):
+    session, server = session
+    path = tmp_path / "song.sng"
+    path.write_bytes( b"local" )
+
+    assert not session.download_attachment( self.attachment( server, "song.sng", b"other" ), str( path ) )
+    assert path.read_bytes() == b"local"
+    assert server.sent
+
+  def test_missing_url( self, session, tmp_path ):
+    session, server = session
+
+    assert not session.download_attachment( { "id": 10, "name": "song.sng" }, str( tmp_path / "song.sng" ) )
+    assert not server.sent
+    assert not ( tmp_path / "song.sng" ).exists()
+
+  def test_failed_status( self, session, tmp_path ):
+    session, server = session
+
+    with pytest.raises( ConnectionError ):
+      session.download_attachment( { "id": 10, "fileUrl": "https://church.tools.local/download/missing.sng" }, str( tmp_path / "song.sng" ) )
+    assert not ( tmp_path / "song.sng" ).exists()
+    assert not ( tmp_path / "song.sng.part" ).exists()
+
+  def test_failed_transfer( self, session, tmp_path, monkeypatch ):
+    session, server = session
+
+    def interrupted( response, chunk_size ):
+      yield b"partial"
+      raise requests.exceptions.ChunkedEncodingError( "Connection broken" )
+
+    monkeypatch.setattr( requests.Response, "iter_content", interrupted )
+    with pytest.raises( requests.exceptions.ChunkedEncodingError ):
+      session.download_attachment( self.attachment( server, "song.sng", b"complete" ), str( tmp_path / "song.sng" ) )
+    assert not ( tmp_path / "song.sng" ).exists()
+    assert not ( tmp_path / "song.sng.part" ).exists()
+
+  def test_export_files( self, session, tmp_path ):
+    session, server = session
+    files = [
+      { "id": 1, "name": "song.sng" },
+      { "id": 2, "name": "backup\\song.sng" },
+      { "id": 3, "name": "sheet.pdf" },
+      { "id": 4, "name": ".." },
+      { "id": 5, "name": "" },
+    ]
+    claimed: dict[ str, int ] = {}
+    song = { "id": 1, "arrangements": [ { "id": 10, "files": files } ] }
+
+    assert [ ( file[ "id" ], path ) for file, path in session.export_files( song, "out", claimed ) ] == [
+      ( 1, os.path.join( "out", "song.sng" ) ), ( 2, os.path.join( "out", "song (2).sng" ) )
+    ]
+    assert [ path for _, path in session.export_files( song, "out", claimed, all_attachments=True ) ] == [
+      os.path.join( "out", "song.sng" ), os.path.join( "out", "song (2).sng" ), os.path.join( "out", "sheet.pdf" )
+    ]
+    assert not server.sent
+
+
+class TestIsolate:
+
+  def test_source_paths( self ):
+    song = SongBeamer.ImportedSong( "Amazing Grace", "a.sng" )
+    assert source_paths( "b.sng" ) == [ "b.sng" ]
+    assert source_paths( song ) == [ "a.sng" ]
+    assert source_paths( ( song, { "id": 1 } ) ) == [ "a.sng" ]
+    assert source_paths( [ song, SongBeamer.ImportedSong( "Holy", "c.sng" ) ] ) == [ "a.sng", "c.sng" ]
+    assert source_paths( { "id": 1 } ) == []
+
+  def test_failing_item( self ):
+    failed: set[ str ] = set()
+    written: list[ str ] = []
+
+    def parse( path ):
+      yield SongBeamer.ImportedSong( path.removesuffix( ".sng" ), path )
+
+    def write( song ):
+      if song.title == "broken":
+        raise ConnectionError( "Failed to create song" )
+      written.append( song.file_name )
+
+    wrap = lambda function: isolate( function, failed, report.QuietReporter() )  # noqa: E731
+    pipeline.Pipeline( pipeline.Stage( "parse", wrap( parse ) ), pipeline.Stage( "write", wrap( write ) ) ).run( [ "a.sng", "broken.sng", "c.sng" ] )
+
+    assert written == [ "a.sng", "c.sng" ]
+    assert failed == { os.path.abspath( "broken.sng" ) }
@@ -0,0 +1,7 @@
+"""The watch Package
+
+The watch package reports files that were created or modified in a set of directories.
+It uses inotify where the system provides it and falls back to periodically scanning the directories otherwise.
+"""
+
+from .watch import Watcher, PollingWatcher, InotifyWatcher, create_watcher, debounce, synchronise
@@ -0,0 +1,192 @@
+import abc
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+import typing
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+event_header = struct.Struct( "iIII" )
+
+
+class Watcher( abc.ABC ):
+
+  def __init__( self, directories: typing.Iterable[ str ], *, suffix: str = "" ) -> None:
+    self.directories: list[ str ] = [ os.path.abspath( d ) for d in directories ]
+    self.suffix: str = suffix
+
+  def accepts( self, path: str ) -> bool:
+    return path.endswith( self.suffix )
+
+  @abc.abstractmethod
+  def changes( self, timeout: float ) -> set[ str ]:
+    pass
+
+  def close( self ):
+    pass
+
+  def __enter__( self ) -> "Watcher":
+    return self
+
+  def __exit__( self, *exception ):
+    self.close()
+
+
+class PollingWatcher( Watcher ):
+
+  def __init__( self, directories: typing.Iterable[ str ], *, suffix: str = "", interval: float = 2.0 ) -> None:
+    super().__init__( directories, suffix=suffix )
+    self.interval: float = interval
+    self.snapshot: dict[ str, tuple[ int, int ] ] = self.scan()
+    self.polled: float = time.monotonic()
+
+  def scan( self ) -> dict[ str, tuple[ int, int ] ]:
+    snapshot: dict[ str, tuple[ int, int ] ] = {}
+    for directory in self.directories:
+      try:
+        for entry in os.scandir( directory ):
+          if entry.is_file() and self.accepts( entry.name ):
+            stat = entry.stat()
+            snapshot[ entry.path ] = ( stat.st_mtime_ns, stat.st_size )
+      except FileNotFoundError:
+        pass
+    return snapshot
+
+  def changes( self, timeout: float ) -> set[ str ]:
+    time.sleep( max( 0.0, min( timeout, self.polled + self.interval - time.monotonic() ) ) )
+    if time.monotonic() - self.polled < self.interval:
+      return set()
+
+    self.polled = time.monotonic()
+    snapshot = self.scan()
+    changed = { path for path, state in snapshot.items() if self.snapshot.get( path ) != state }
+    self.snapshot = snapshot
+    return changed
+
+
+class InotifyWatcher( Watcher ):
+
+  mask: int = IN_CLOSE_WRITE | IN_MOVED_TO
+
+  def __init__( self, directories: typing.Iterable[ str ], *, suffix: str = "" ) -> None:
+    super().__init__( directories, suffix=suffix )
+
+    self.libc = load_libc()
+    if self.libc is None:
+      raise OSError( "inotify is not available on this system." )
+
+    self.fd: int = self.libc.inotify_init1( IN_NONBLOCK | IN_CLOEXEC )
+    if self.fd < 0:
+      raise OSError( ctypes.get_errno(), "Failed to initialise inotify." )
+
+    self.paths: dict[ int, str ] = {}
+    try:
+      for directory in self.directories:
+        wd = self.libc.inotify_add_watch( self.fd, os.fsencode( directory ), self.mask )
+        if wd < 0:
+          error = ctypes.get_errno()
+          raise OSError( error, f"Failed to watch '{ directory }': { os.strerror( error ) }" )
+        self.paths[ wd ] = directory
+    except OSError:
+      os.close( self.fd )
+      raise
+
+  def changes( self, timeout: float ) -> set[ str ]:
+    readable, _, _ = select.select( [ self.fd ], [], [], timeout )
+    if not readable:
+      return set()
+
+    data = os.read( self.fd, 1 << 16 )
+    changed: set[ str ] = set()
+    offset = 0
+    while offset + event_header.size <= len( data ):
+      wd, mask, _, length = event_header.unpack_from( data, offset )
+      offset += event_header.size
+      name = os.fsdecode( data[ offset:offset + length ].rstrip( b"\0" ) )
+      offset += length
+
+      if mask & IN_Q_OVERFLOW:
+        changed.update( self.rescan() )
+      elif ( directory := self.paths.get( wd ) ) and name and self.accepts( name ):
+        changed.add( os.path.join( directory, name ) )
+
+    return changed
+
+  def rescan( self ) -> set[ str ]:
+    return {
+      entry.path for directory in self.directories for entry in os.scandir( directory )
+      if entry.is_file() and self.accepts( entry.name )
+    }
+
+  def close( self ):
+    if self.fd >= 0:
+      os.close( self.fd )
+      self.fd = -1
+
+
+def load_libc():
+  if not hasattr( select, "select" ) or not ( name := ctypes.util.find_library( "c" ) ):
+    return None
+  try:
+    libc = ctypes.CDLL( name, use_errno=True )
+  except OSError:
+    return None
+  if not hasattr( libc, "inotify_init1" ):
+    return None
+  libc.inotify_add_watch.argtypes = ( ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32 )
+  return libc
+
+
+def create_watcher( directories: typing.Iterable[ str ], *, suffix: str = "", interval: float = 2.0 ) -> Watcher:
+  directories = list( directories )
+  try:
+    return InotifyWatcher( directories, suffix=suffix )
+  except OSError:
+    return PollingWatcher( directories, suffix=suffix, interval=interval )
+
+
+def debounce( watcher: Watcher, *, delay: float = 1.0, timeout: float = 0.5 ) -> typing.Iterator[ set[ str ] ]:
+  pending: set[ str ] = set()
+  last_change = 0.0
+
+  while True:
+    if changed := watcher.changes( min( timeout, delay ) if pending else timeout ):
+      pending.update( changed )
+      last_change = time.monotonic()
+    elif pending and time.monotonic() - last_change >= delay:
+      yield pending
+      pending = set()
+
+
+# sync returns the paths it failed on and reports its own errors.
+# Failed paths, or the whole batch if sync raises, are retried together with the next change; each step yields what is left to retry.
+def synchronise(
+  watcher: Watcher, sync: typing.Callable[ [ list[ str ] ], typing.Iterable[ str ] ], sources: typing.Iterable[ str ], *,
+  select: typing.Callable[ [ str ], bool ] | None = None, delay: float = 1.0, timeout: float = 0.5
+) -> typing.Iterator[ set[ str ] ]:
+  retry = attempt( sync, list( sources ) )
+  yield retry
+
+  for changed in debounce( watcher, delay=delay, timeout=timeout ):
+    if select is not None:
+      changed = { path for path in changed if select( path ) }
+    if not changed:
+      continue
+
+    retry = attempt( sync, sorted( path for path in changed | retry if os.path.exists( path ) ) )
+    yield retry
+
+
+def attempt( sync: typing.Callable[ [ list[ str ] ], typing.Iterable[ str ] ], paths: list[ str ] ) -> set[ str ]:
+  try:
+    return set( sync( paths ) )
+  except Exception:
+    return set( paths )
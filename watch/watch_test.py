@@ -0,0 +1,164 @@
+import os
+
+import pytest
+
+from .watch import Watcher, PollingWatcher, InotifyWatcher, create_watcher, debounce, load_libc, synchronise
+
+
+def write( path, content: str = "#Title=Amazing Grace\n" ):
+  with open( path, "w" ) as file:
+    file.write( content )
+
+
+class ScriptedWatcher( Watcher ):
+
+  def __init__( self, changes: list[ set[ str ] ], *, suffix: str = "" ) -> None:
+    super().__init__( [], suffix=suffix )
+    self.script = list( changes )
+
+  def changes( self, timeout: float ) -> set[ str ]:
+    return self.script.pop( 0 ) if self.script else set()
+
+
+class TestWatcher:
+
+  def test_abstract( self ):
+    with pytest.raises( TypeError ):
+      Watcher( [] )
+
+  def test_accepts( self ):
+    watcher = ScriptedWatcher( [], suffix=".sng" )
+    assert watcher.accepts( "song.sng" )
+    assert not watcher.accepts( "song.txt" )
+
+
+class TestPollingWatcher:
+
+  def test_changes( self, tmp_path ):
+    existing = tmp_path / "existing.sng"
+    write( existing )
+
+    with PollingWatcher( [ tmp_path ], suffix=".sng", interval=0.0 ) as watcher:
+      assert watcher.changes( 0.0 ) == set()
+
+      created = tmp_path / "created.sng"
+      write( created )
+      write( tmp_path / "ignored.txt" )
+      assert watcher.changes( 0.0 ) == { str( created ) }
+
+      write( existing, "#Title=Amazing Grace\n#Key=G\n" )
+      assert watcher.changes( 0.0 ) == { str( existing ) }
+
+  def test_interval( self, tmp_path ):
+    with PollingWatcher( [ tmp_path ], suffix=".sng", interval=60.0 ) as watcher:
+      write( tmp_path / "created.sng" )
+      assert watcher.changes( 0.0 ) == set()
+
+  def test_missing_directory( self, tmp_path ):
+    with PollingWatcher( [ tmp_path / "missing" ], interval=0.0 ) as watcher:
+      assert watcher.changes( 0.0 ) == set()
+
+
+@pytest.mark.skipif( load_libc() is None, reason="inotify is not available" )
+class TestInotifyWatcher:
+
+  def test_changes( self, tmp_path ):
+    with InotifyWatcher( [ tmp_path ], suffix=".sng" ) as watcher:
+      assert watcher.changes( 0.0 ) == set()
+
+      created = tmp_path / "created.sng"
+      write( created )
+      write( tmp_path / "ignored.txt" )
+      assert watcher.changes( 1.0 ) == { str( created ) }
+
+  def test_moved( self, tmp_path ):
+    with InotifyWatcher( [ tmp_path ], suffix=".sng" ) as watcher:
+      temporary = tmp_path / "song.tmp"
+      write( temporary )
+      watcher.changes( 1.0 )
+
+      target = tmp_path / "song.sng"
+      os.rename( temporary, target )
+      assert watcher.changes( 1.0 ) == { str( target ) }
+
+  def test_missing_directory( self, tmp_path ):
+    with pytest.raises( OSError ):
+      InotifyWatcher( [ tmp_path / "missing" ] )
+
+
+class TestCreateWatcher:
+
+  def test_fallback( self, tmp_path ):
+    with create_watcher( [ tmp_path / "missing" ], suffix=".sng" ) as watcher:
+      assert isinstance( watcher, PollingWatcher )
+
+
+class TestDebounce:
+
+  def test_burst( self ):
+    watcher = ScriptedWatcher( [ { "a.sng" }, { "b.sng" }, { "a.sng" } ] )
+    batches = debounce( watcher, delay=0.0, timeout=0.0 )
+    assert next( batches ) == { "a.sng", "b.sng" }
+
+  def test_separate_bursts( self ):
+    watcher = ScriptedWatcher( [ { "a.sng" }, set(), { "b.sng" } ] )
+    batches = debounce( watcher, delay=0.0, timeout=0.0 )
+    assert next( batches ) == { "a.sng" }
+    assert next( batches ) == { "b.sng" }
+
+
+class TestSynchronise:
+
+  def test_initial( self, tmp_path ):
+    synced: list[ list[ str ] ] = []
+    steps = synchronise( ScriptedWatcher( [] ), lambda paths: synced.append( paths ) or [], [ str( tmp_path ) ], delay=0.0, timeout=0.0 )
+    assert next( steps ) == set()
+    assert synced == [ [ str( tmp_path ) ] ]
+
+  def test_initial_failure( self, tmp_path ):
+    a, b = str( tmp_path / "a.sng" ), str( tmp_path / "b.sng" )
+    write( a )
+    write( b )
+    synced: list[ list[ str ] ] = []
+
+    def sync( paths ):
+      synced.append( paths )
+      return [ a ] if len( synced ) == 1 else []
+
+    steps = synchronise( ScriptedWatcher( [ { b } ] ), sync, [ str( tmp_path ) ], delay=0.0, timeout=0.0 )
+    assert next( steps ) == { a }
+    assert next( steps ) == set()
+    assert synced[ 1 ] == [ a, b ]
+
+  def test_raising( self, tmp_path ):
+    a, b = str( tmp_path / "a.sng" ), str( tmp_path / "b.sng" )
+    write( a )
+    write( b )
+    synced: list[ list[ str ] ] = []
+
+    def sync( paths ):
+      synced.append( paths )
+      if len( synced ) == 2:
+        raise KeyError( "unexpected" )
+      return []
+
+    steps = synchronise( ScriptedWatcher( [ { a }, set(), { b } ] ), sync, [], delay=0.0, timeout=0.0 )
+    assert next( steps ) == set()
+    assert next( steps ) == { a }
+    assert next( steps ) == set()
+    assert synced[ 1: ] == [ [ a ], [ a, b ] ]
+
+  def test_select_and_vanished( self, tmp_path ):
+    kept, vanished = str( tmp_path / "kept.sng" ), str( tmp_path / "vanished.sng" )
+    write( kept )
+    synced: list[ list[ str ] ] = []
+
+    def sync( paths ):
+      synced.append( paths )
+      return [ vanished ] if len( synced ) == 1 else []
+
+    watcher = ScriptedWatcher( [ { "elsewhere.sng" }, set(), { kept } ] )
+    steps = synchronise( watcher, sync, [], select=lambda path: path.startswith( str( tmp_path ) ), delay=0.0, timeout=0.0 )
+    assert next( steps ) == { vanished }
+    assert next( steps ) == set()
+    assert synced[ 1 ] == [ kept ]